@@ -0,0 +1,276 @@
+"""
+Append-only JSONL answer log for local and offline deployments.
+
+Records are appended to data/answer_log/active.jsonl. Concurrent appends
+share one fsync: a committer thread waits up to ANSWER_LOG_COMMIT_MS for
+more writers, syncs once and wakes every append it covered. Once the
+active file holds ANSWER_LOG_SEGMENT_RECORDS records, or is
+ANSWER_LOG_SEGMENT_SECONDS old, it is sealed into an immutable
+segment-<n>.jsonl; after each seal, runs of small sealed segments are
+compacted into one.
+iter_records() streams everything back in append order without loading
+the log into memory.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_DIR = os.getenv("ANSWER_LOG_DIR", os.path.join("data", "answer_log"))
+DEFAULT_COMMIT_MS = float(os.getenv("ANSWER_LOG_COMMIT_MS", "10"))
+DEFAULT_SEGMENT_RECORDS = int(os.getenv("ANSWER_LOG_SEGMENT_RECORDS", "10000"))
+DEFAULT_SEGMENT_SECONDS = float(os.getenv("ANSWER_LOG_SEGMENT_SECONDS", "3600"))
+LEGACY_RESPONSES_PATH = os.path.join("data", "question_responses.json")
+
+ACTIVE_NAME = "active.jsonl"
+SEGMENT_PATTERN = "segment-*.jsonl"
+
+
+class AnswerLog:
+    """Append-only, segmented JSONL log with group-committed fsync."""
+
+    def __init__(self, directory: str = DEFAULT_LOG_DIR,
+                 commit_ms: float = DEFAULT_COMMIT_MS,
+                 segment_records: int = DEFAULT_SEGMENT_RECORDS,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS):
+        self.directory = directory
+        self.commit_window = commit_ms / 1000
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._written = 0      # sequence number of the last record written
+        self._durable = 0      # sequence number of the last record fsynced
+        self.commits = 0
+
+        self._segment_counts: Dict[str, int] = {}
+        self._recover_compaction()
+        self._active_path = os.path.join(directory, ACTIVE_NAME)
+        self._active_records = self._recover_active()
+        self._file = open(self._active_path, 'a', encoding='utf-8')
+        self._active_since = time.monotonic()
+        self._next_segment = self._last_segment_number() + 1
+
+        self._committer = threading.Thread(target=self._commit_loop, name="answer-log-commit", daemon=True)
+        self._committer.start()
+
+    def _recover_active(self) -> int:
+        """Count complete records in the active file, cutting off a torn final line."""
+        if not os.path.exists(self._active_path):
+            return 0
+        count, good_bytes = 0, 0
+        with open(self._active_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                count += 1
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(self._active_path):
+            logger.warning("Truncating torn record at the end of %s", self._active_path)
+            with open(self._active_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return count
+
+    def _segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        return int(os.path.basename(path)[len("segment-"):-len(".jsonl")])
+
+    def _last_segment_number(self) -> int:
+        segments = self._segments()
+        return self._segment_number(segments[-1]) if segments else 0
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:08d}.jsonl")
+
+    def append(self, record: Dict, durable: bool = True) -> int:
+        """
+        Append a record and return its sequence number.
+
+        With durable set, returns only once the record is fsynced; appends
+        arriving within the commit window share that fsync.
+        """
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._written += 1
+            self._active_records += 1
+            seq = self._written
+            self._synced.notify_all()
+            if durable:
+                while self._durable < seq:
+                    self._synced.wait()
+        return seq
+
+    def _commit_loop(self) -> None:
+        while True:
+            with self._lock:
+                while self._durable == self._written:
+                    self._synced.wait()
+            # Let more writers join this commit
+            time.sleep(self.commit_window)
+            with self._lock:
+                target = self._written
+                self._file.flush()
+                fd = self._file.fileno()
+            # Appends carry on during the fsync; only this thread seals (replaces) the file
+            os.fsync(fd)
+            with self._lock:
+                self._durable = target
+                self.commits += 1
+                sealed = self._active_records >= self.segment_records or (
+                    time.monotonic() - self._active_since >= self.segment_seconds)
+                if sealed:
+                    self._seal_active()
+                self._synced.notify_all()
+            if sealed:
+                self.compact()
+
+    def _seal_active(self) -> None:
+        # Called with self._lock held and the active file fsynced
+        self._file.close()
+        os.replace(self._active_path, self._segment_path(self._next_segment))
+        self._next_segment += 1
+        self._fsync_directory()
+        self._file = open(self._active_path, 'a', encoding='utf-8')
+        self._active_records = 0
+        self._active_since = time.monotonic()
+
+    def _fsync_directory(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _segment_count(self, path: str) -> int:
+        # Sealed segments never change, so their record counts are cached
+        count = self._segment_counts.get(path)
+        if count is None:
+            with open(path, 'rb') as f:
+                count = self._segment_counts[path] = sum(1 for _ in f)
+        return count
+
+    def compact(self, min_records: Optional[int] = None) -> int:
+        """
+        Merge the first run of consecutive sealed segments smaller than
+        min_records (default: the segment size) into one. Returns the number
+        of segments merged.
+        """
+        min_records = min_records or self.segment_records
+        with self._lock:
+            small = []
+            for path in self._segments():
+                if self._segment_count(path) < min_records:
+                    small.append(path)
+                    continue
+                if len(small) > 1:
+                    break
+                small = []
+            if len(small) < 2:
+                return 0
+
+            # Stage the merge, then publish it under a name recording the last
+            # segment it covers so recovery can finish an interrupted compaction
+            partial_path = small[0] + '.partial'
+            with open(partial_path, 'wb') as out:
+                for path in small:
+                    with open(path, 'rb') as f:
+                        out.write(f.read())
+                out.flush()
+                os.fsync(out.fileno())
+            merged_path = f"{small[0]}.compact-{self._segment_number(small[-1])}"
+            os.replace(partial_path, merged_path)
+            self._fsync_directory()
+            self._finish_compaction(merged_path)
+        logger.info("Compacted %d answer log segments", len(small))
+        return len(small)
+
+    def _finish_compaction(self, merged_path: str) -> None:
+        first_path, last = merged_path.rsplit('.compact-', 1)
+        first = self._segment_number(first_path)
+        for path in self._segments():
+            if first < self._segment_number(path) <= int(last):
+                os.remove(path)
+                self._segment_counts.pop(path, None)
+        os.replace(merged_path, first_path)
+        self._segment_counts.pop(first_path, None)
+        self._fsync_directory()
+
+    def _recover_compaction(self) -> None:
+        for path in glob.glob(os.path.join(self.directory, "segment-*.jsonl.partial")):
+            os.remove(path)
+        for path in glob.glob(os.path.join(self.directory, "segment-*.jsonl.compact-*")):
+            logger.warning("Finishing interrupted compaction %s", path)
+            self._finish_compaction(path)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Stream every record appended so far, oldest first."""
+        with self._lock:
+            self._file.flush()
+            # Open everything up front so a concurrent seal or compaction cannot
+            # move a file out from under the reader
+            handles = [open(path, encoding='utf-8') for path in self._segments() + [self._active_path]]
+        for handle in handles:
+            with handle:
+                for line in handle:
+                    if line.endswith('\n'):
+                        yield json.loads(line)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._written == 0 and self._active_records == 0 and not self._segments()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.iter_records())
+
+    def import_json_array(self, path: str) -> int:
+        """One-off import of a legacy JSON array file (e.g. question_responses.json)."""
+        try:
+            with open(path) as f:
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        for record in records:
+            self.append(record, durable=False)
+        self.sync()
+        return len(records)
+
+    def sync(self) -> None:
+        """Wait until everything appended so far is durable."""
+        with self._lock:
+            target = self._written
+            self._synced.notify_all()
+            while self._durable < target:
+                self._synced.wait()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_answer_log() -> AnswerLog:
+    """
+    Return the process-wide answer log. On first use, answers from the old
+    data/question_responses.json are imported if the log is still empty.
+    """
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                log = AnswerLog()
+                if log.is_empty():
+                    imported = log.import_json_array(LEGACY_RESPONSES_PATH)
+                    if imported:
+                        logger.info("Imported %d answers from %s", imported, LEGACY_RESPONSES_PATH)
+                _log = log
+    return _log
@@ -0,0 +1,184 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_PATH = os.getenv("ANSWER_SPOOL_PATH", os.path.join("data", "answer_spool.jsonl"))
+DEFAULT_BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", "10"))
+DEFAULT_FLUSH_SECONDS = float(os.getenv("ANSWER_FLUSH_SECONDS", "30"))
+MAX_RETRY_DELAY = 300.0
+
+
+class AnswerSpool:
+    """
+    Write-behind buffer for answer uploads.
+
+    submit() appends the answer to a local JSONL spool (fsynced) and returns
+    at once. A background thread hands everything pending to `uploader` as
+    one batch when batch_size answers are waiting or the oldest has waited
+    flush_seconds, and on interpreter exit. Answers are removed from the
+    spool only after the uploader returns, so a crash loses nothing; answers
+    left in the spool are uploaded by the next process. Uploads are
+    at-least-once (a crash between upload and spool rewrite, or a failure
+    part-way through a multi-pin upload, re-uploads the batch), so each
+    answer carries an answer_id and score replays skip repeated IDs.
+    """
+
+    def __init__(self, uploader: Callable[[List[Dict]], Any],
+                 path: str = DEFAULT_SPOOL_PATH,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS):
+        self.uploader = uploader
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.uploaded = 0
+        self.failed_flushes = 0
+        self.last_error: Optional[str] = None
+        self._pending: List[Dict] = []
+        self._oldest: Optional[float] = None
+        self._retry_at = 0.0
+        self._retry_delay = 1.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._force = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+        self._thread = threading.Thread(target=self._run, name="answer-spool", daemon=True)
+        self._thread.start()
+
+    def _recover(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._pending.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    logger.warning("Skipping unreadable line in answer spool %s", self.path)
+        # Rewrite so a torn final line cannot merge with the next append
+        self._rewrite_spool()
+        if self._pending:
+            self._oldest = time.monotonic() - self.flush_seconds  # flush recovered answers right away
+            logger.info("Recovered %d unsent answers from %s", len(self._pending), self.path)
+
+    def submit(self, answer: Dict) -> Dict:
+        """Durably queue an answer; returns an acknowledgement without any network I/O."""
+        answer = dict(answer, answer_id=answer.get('answer_id') or uuid.uuid4().hex)
+        line = json.dumps(answer) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.append(answer)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wake.set()
+        return {"status": "queued", "answer_id": answer['answer_id'], "pending": pending}
+
+    def request_flush(self) -> None:
+        """Ask the background thread to flush now, e.g. at the end of a practice session."""
+        self._force = True
+        self._wake.set()
+
+    def _due(self) -> bool:
+        with self._lock:
+            if not self._pending or time.monotonic() < self._retry_at:
+                return False
+            if self._force:
+                self._force = False
+                return True
+            return (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._oldest >= self.flush_seconds)
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(timeout=min(1.0, self.flush_seconds))
+            self._wake.clear()
+            if self._due():
+                self.flush()
+
+    def flush(self) -> int:
+        """Upload everything pending as one batch. Returns the number of answers uploaded."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            try:
+                self.uploader(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed_flushes += 1
+                    self.last_error = str(e)
+                    self._retry_at = time.monotonic() + self._retry_delay
+                    self._retry_delay = min(self._retry_delay * 2, MAX_RETRY_DELAY)
+                logger.warning("Answer batch upload failed (%d answers kept in spool): %s", len(batch), e)
+                return 0
+
+            with self._lock:
+                # Answers submitted during the upload stay pending
+                self._pending = self._pending[len(batch):]
+                self._oldest = time.monotonic() if self._pending else None
+                self._rewrite_spool()
+                self.uploaded += len(batch)
+                self.last_error = None
+                self._retry_delay = 1.0
+            logger.info("Uploaded %d answers in one batch", len(batch))
+            return len(batch)
+
+    def _rewrite_spool(self) -> None:
+        # Called with self._lock held (or before the background thread starts)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(answer) + '\n' for answer in self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        """Stop the background thread and make a final flush attempt."""
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "uploaded": self.uploaded,
+                "failed_flushes": self.failed_flushes,
+                "last_error": self.last_error,
+            }
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_answer_spool(uploader: Callable[[List[Dict]], Any]) -> AnswerSpool:
+    """Return the process-wide answer spool, creating it with `uploader` on first use."""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = AnswerSpool(uploader)
+                atexit.register(_spool.close)
+    return _spool
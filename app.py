@@ -1,100 +1,94 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string, stream_with_context
 import os
-import openai
 import json
+import math
 import logging
-import requests
 from typing import Dict, List
 from dotenv import load_dotenv
 import time
-import functools
-import logging
-from typing import Callable, Any
-from collections import defaultdict
+from typing import Callable, Any, Iterator
+
+from log_config import configure_logging, payload
+from metrics import PROMETHEUS_CONTENT_TYPE, function_stats, observe_request, render_prometheus, timed
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class FunctionTimer:
-    _timing_stats = defaultdict(lambda: {"calls": 0, "total_time": 0, "avg_time": 0, "min_time": float('inf'), "max_time": 0})
-    
+    """
+    Per-function latency tracking, backed by the histograms in metrics.py.
+
+    Nothing is logged per call; read the numbers from get_stats(),
+    print_stats() or the /metrics endpoint.
+    """
+
     @classmethod
     def timer(cls, func: Callable) -> Callable:
         """
-        Decorator to measure and log function execution time
+        Decorator to measure function execution time.
+        Works on both regular and async functions.
         """
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs) -> Any:
-            start_time = time.time()
-            try:
-                result = func(*args, **kwargs)
-                return result
-            finally:
-                end_time = time.time()
-                execution_time = end_time - start_time
-                
-                # Update statistics
-                stats = cls._timing_stats[func.__name__]
-                stats["calls"] += 1
-                stats["total_time"] += execution_time
-                stats["avg_time"] = stats["total_time"] / stats["calls"]
-                stats["min_time"] = min(stats["min_time"], execution_time)
-                stats["max_time"] = max(stats["max_time"], execution_time)
-                
-                logger.info(
-                    f"Function '{func.__name__}' executed in {execution_time:.4f} seconds. "
-                    f"Avg: {stats['avg_time']:.4f}s, "
-                    f"Min: {stats['min_time']:.4f}s, "
-                    f"Max: {stats['max_time']:.4f}s, "
-                    f"Calls: {stats['calls']}"
-                )
-        
-        return wrapper
-    
+        return timed(func)
+
     @classmethod
     def get_stats(cls) -> dict:
         """
         Return all collected timing statistics
         """
-        return dict(cls._timing_stats)
-    
+        return {
+            name: {
+                "calls": snap["count"],
+                "total_time": snap["sum"],
+                "avg_time": snap["avg"],
+                "min_time": snap["min"],
+                "max_time": snap["max"],
+                "p50": snap["p50"],
+                "p90": snap["p90"],
+                "p99": snap["p99"],
+                "p999": snap["p999"],
+            }
+            for name, snap in function_stats().items()
+        }
+
     @classmethod
     def print_stats(cls) -> None:
         """
         Print a summary of all function timing statistics
         """
         logger.info("\n=== Function Timing Statistics ===")
-        for func_name, stats in cls._timing_stats.items():
+        for func_name, stats in cls.get_stats().items():
             logger.info(
-                f"\nFunction: {func_name}\n"
-                f"Total calls: {stats['calls']}\n"
-                f"Total time: {stats['total_time']:.4f}s\n"
-                f"Average time: {stats['avg_time']:.4f}s\n"
-                f"Min time: {stats['min_time']:.4f}s\n"
-                f"Max time: {stats['max_time']:.4f}s"
+                "\nFunction: %s\nTotal calls: %d\nTotal time: %.4fs\nAverage time: %.4fs\n"
+                "p50/p90/p99/p999: %.4fs / %.4fs / %.4fs / %.4fs\nMin time: %.4fs\nMax time: %.4fs",
+                func_name, stats['calls'], stats['total_time'], stats['avg_time'],
+                stats['p50'], stats['p90'], stats['p99'], stats['p999'], stats['min_time'], stats['max_time']
             )
 #from files import upload_question()
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+# Set up logging: JSON records written by a background thread (LOG_LEVEL, LOG_FORMAT)
+configure_logging()
 
 # Initialize Flask app
 app = Flask(__name__)
 
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
 
-# Configure OpenAI client for SambaNova
 
-SAMBANOVA_API_KEY = os.getenv("SAMBANOVA_API_KEY", "cf134cde-f4d2-4e6d-90b4-500e269eb286")
-client = openai.OpenAI(
-    api_key=SAMBANOVA_API_KEY,
-    base_url="https://api.sambanova.ai/v1"
-)
+@app.after_request
+def record_request_metrics(response):
+    # Streaming responses are timed to their first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(route, request.method, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
+
+
+# The SambaNova (OpenAI-compatible) client is created on first use by llm_client.get_llm_client()
 
 # # Sample test data
 # SAMPLE_USER_RESULTS = {
@@ -117,70 +111,67 @@ SAMPLE_USA_RESULTS = {
     "Reading": 21,
     "Science": 21
 }
+
+# Bump whenever the generation prompt changes so cached sets are not reused
+PROMPT_VERSION = "app-v2"
+# "single": one completion for all subjects; "fanout": one concurrent completion per subject
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+# Directory to save raw completions into, for the JSON extraction benchmark (unset: off)
+LLM_RESPONSE_CORPUS_DIR = os.getenv("LLM_RESPONSE_CORPUS_DIR")
 # Add this HTML_TEMPLATE constant right after the sample data constants and before the functions
 
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-import requests
+from typing import List, Dict, Optional, Tuple
+
+from cid_cache import get_cid_cache
+from generation_cache import get_generation_cache, is_cacheable, profile_key
+from history_summary import summarize_history
+from http_client import PINATA_GATEWAY_URL, get_http_client
+from llm_client import get_llm_client
+from llm_json import completion_deltas, extract_json_objects, iter_array_objects
+from pin_index import sync_pin_index
+from pinata_fetch import fetch_pinned_questions
+from singleflight import get_singleflight, singleflight_stats
+from subject_fanout import SUBJECT_MAX_TOKENS, fan_out
+from subjects import SUBJECT_MAP, SUBJECTS
 
 @FunctionTimer.timer
-def get_pinata_questions(jwt_token: str) -> List[Dict]:
+def get_pinata_questions(jwt_token: str, student_id: Optional[str] = None) -> List[Dict]:
     """
     Retrieve the last 3 pinned questions from Pinata.
 
     Args:
         jwt_token (str): Pinata JWT token
+        student_id (Optional[str]): Only read this student's pins
 
     Returns:
         List[Dict]: List of question data from the last 3 pinned files
     """
-    # API endpoint for getting pinned files
-    url = "https://api.pinata.cloud/data/pinList?status=pinned"
-
-    headers = {
-        "Authorization": f"Bearer {jwt_token}"
-    }
-
     try:
-        # Get list of pinned files
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        pinned_files = response.json()
-
-        # Sort pinned files by pin timestamp (assuming 'date_pinned' exists)
-        sorted_files = sorted(
-            pinned_files.get('rows', []),
-            key=lambda x: x.get('date_pinned', ''),
-            reverse=True
-        )
-
-        # Get the last 3 pinned files
-        last_three_files = sorted_files[:3]
-
-        all_questions = []
+        # Delta-sync the local pin mirror, then take the last 3 pins from it
+        last_three_files = sync_pin_index(jwt_token, student_id).latest(3, student_id)
 
-        # Iterate through the last 3 pinned files
-        for row in last_three_files:
-            cid = row.get('ipfs_pin_hash')
-
-            # Get content of each file
-            content = get_file_content(cid)
-            if content:
-                # If content is a list, extend all_questions
-                if isinstance(content, list):
-                    all_questions.extend(content)
-                # If content is a single question dict, append it
-                elif isinstance(content, dict):
-                    all_questions.append(content)
+        # Fetch the last 3 pinned files in parallel, keeping pin order
+        all_questions, failures = fetch_pinned_questions(last_three_files, get_file_content)
+        for failure in failures:
+            logger.warning("Error getting file content for %s: %s", failure.cid, failure.error)
 
         return all_questions
 
     except Exception as e:
-        print(f"Error getting pinned questions: {e}")
+        logger.error("Error getting pinned questions: %s", e)
         return []
 
+# Concurrent requests for the same history or payload share one upstream call
+history_flight = get_singleflight("pinata_history")
+generation_flight = get_singleflight("generate_questions")
+
+def get_question_history(jwt_token: str, student_id: Optional[str] = None) -> List[Dict]:
+    """get_pinata_questions, coalesced across concurrent requests for the same student."""
+    return history_flight.do((jwt_token, student_id), lambda: get_pinata_questions(jwt_token, student_id))
+
 @FunctionTimer.timer
-def get_file_content(cid: str) -> Optional[Dict]:
+def get_file_content(cid: str) -> Dict:
     """
     Get content of a specific file by CID.
 
@@ -188,44 +179,58 @@ def get_file_content(cid: str) -> Optional[Dict]:
         cid (str): The IPFS CID of the file
 
     Returns:
-        Optional[Dict]: The file content as JSON if successful, None if failed
+        Dict: The file content as JSON
+
+    Raises:
+        Exception: If the gateway read fails or the file is not valid JSON;
+            fetch_pinned_questions reports it on the CID's FetchResult
     """
-    url = f"https://gateway.pinata.cloud/ipfs/{cid}"
+    # CID content is immutable, so a cached copy is always current
+    cache = get_cid_cache()
+    cached = cache.get(cid)
+    if cached is not None:
+        return cached
 
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
+    url = f"{PINATA_GATEWAY_URL}/ipfs/{cid}"
 
-        # Try to parse as JSON
-        try:
-            print("clutch")
-            print(response.json())
-            return response.json()
-        except ValueError:
-            print(f"File {cid} is not valid JSON")
-            return None
+    response = get_http_client().get(url)
+    response.raise_for_status()
+    content = response.json()
+    logger.debug("Fetched %s: %s", cid, payload(content))
+    cache.put(cid, content)
+    return content
 
-    except Exception as e:
-        print(f"Error getting file content for {cid}: {e}")
-        return None
-@FunctionTimer.timer
-def generate_questions(user_results: Dict, regional_results: Dict) -> List[Dict]:
-    jwt_token = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJ1c2VySW5mb3JtYXRpb24iOnsiaWQiOiI4YmVmMTM1YS03NDY2LTQ1MjQtODhjMy00MGYzNzg2NmViZDciLCJlbWFpbCI6InNpbW9uZ2FnZTBAZ21haWwuY29tIiwiZW1haWxfdmVyaWZpZWQiOnRydWUsInBpbl9wb2xpY3kiOnsicmVnaW9ucyI6W3siZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiRlJBMSJ9LHsiZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiTllDMSJ9XSwidmVyc2lvbiI6MX0sIm1mYV9lbmFibGVkIjpmYWxzZSwic3RhdHVzIjoiQUNUSVZFIn0sImF1dGhlbnRpY2F0aW9uVHlwZSI6InNjb3BlZEtleSIsInNjb3BlZEtleUtleSI6ImZhNjUxNWZkOTRkMDMyZGQwN2QzIiwic2NvcGVkS2V5U2VjcmV0IjoiOWUyZTRiOTE4NDVjMDA4OWE3YzM0NDdhZDVhZDJkZTAyMTdkNGM5MjExOTI2ODEyZDZmMWRkMDlmYmU2ODA4NCIsImV4cCI6MTc2MzM1NzkxNH0.zpWQXD9YWbE6BKiBavUtGyZJJkrEiZ4x0j1zxzgpmJs"
+# Pinata account holding answered-question history
+PINATA_JWT_TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJ1c2VySW5mb3JtYXRpb24iOnsiaWQiOiI4YmVmMTM1YS03NDY2LTQ1MjQtODhjMy00MGYzNzg2NmViZDciLCJlbWFpbCI6InNpbW9uZ2FnZTBAZ21haWwuY29tIiwiZW1haWxfdmVyaWZpZWQiOnRydWUsInBpbl9wb2xpY3kiOnsicmVnaW9ucyI6W3siZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiRlJBMSJ9LHsiZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiTllDMSJ9XSwidmVyc2lvbiI6MX0sIm1mYV9lbmFibGVkIjpmYWxzZSwic3RhdHVzIjoiQUNUSVZFIn0sImF1dGhlbnRpY2F0aW9uVHlwZSI6InNjb3BlZEtleSIsInNjb3BlZEtleUtleSI6ImZhNjUxNWZkOTRkMDMyZGQwN2QzIiwic2NvcGVkS2V5U2VjcmV0IjoiOWUyZTRiOTE4NDVjMDA4OWE3YzM0NDdhZDVhZDJkZTAyMTdkNGM5MjExOTI2ODEyZDZmMWRkMDlmYmU2ODA4NCIsImV4cCI6MTc2MzM1NzkxNH0.zpWQXD9YWbE6BKiBavUtGyZJJkrEiZ4x0j1zxzgpmJs"
 
+SYSTEM_PROMPT = "You are an educational assistant that generates targeted practice questions based on weaknesses and test performance analysis. Return responses in JSON format. Always include necessary context for questions."
 
-    questions_answered = get_pinata_questions(jwt_token)
+def build_generation_messages(user_results: Dict, regional_results: Dict, questions_answered: List[Dict],
+                              subject: Optional[str] = None) -> List[Dict]:
     """
-    Generate and parse ACT practice questions based on test results using LLaMA API
+    Build the chat messages asking the LLM for one question per subject,
+    or for a single question in `subject` when given.
+
+    Answer history is summarized to fit HISTORY_TOKEN_BUDGET rather than
+    embedded verbatim, so prompt size stays flat as history grows.
     """
+    history = summarize_history(questions_answered)
+    if subject:
+        task = (f"Generate 1 ACT-style multiple choice practice question for {subject}, "
+                f"focusing on the areas of {subject} needing improvement.")
+    else:
+        task = ("Generate 4 ACT-style multiple choice practice questions, one for each subject, "
+                "focusing on areas needing improvement.")
     prompt = f"""
     Given the following test results:
     User ACT Results: {user_results}
     Regional ACT Results: {regional_results}
     USA Median ACT Results: {SAMPLE_USA_RESULTS}
 
-    Questions Previously Asnwered: {questions_answered}
+    Summary of Questions Previously Answered:
+    {history}
 
-    Generate 4 ACT-style multiple choice practice questions, one for each subject, focusing on areas needing improvement.
+    {task}
     For each question:
     1. Include any necessary context (passages, equations, diagrams described in text, etc.) before the question
     2. Provide the actual question
@@ -260,78 +265,195 @@ def generate_questions(user_results: Dict, regional_results: Dict) -> List[Dict]
     The correct answer should be randomly distributed among A, B, C, and D across questions.
     """
 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def validate_question(q: Dict) -> bool:
+    """
+    Check a generated question has every required field, all four options,
+    and a passage for Reading/English. Logs why a question was rejected.
+    """
+    required_fields = {"context", "question", "options", "correct_option", "explanation", "category",
+                       "difficulty"}
+
+    if not isinstance(q, dict) or not all(field in q for field in required_fields):
+        logger.warning("Skipping invalid question format: %s", payload(q))
+        return False
+    if not (isinstance(q["options"], dict) and all(opt in q["options"] for opt in ["A", "B", "C", "D"])):
+        logger.warning("Invalid options format in question: %s", payload(q))
+        return False
+    # Ensure context is not empty for Reading/English questions
+    if q["category"] in ["Reading", "English"] and not q["context"].strip():
+        logger.warning("Skipping question with empty context: %s", payload(q))
+        return False
+    return True
+
+def score_payload_error(data: Dict) -> Optional[str]:
+    """
+    Check that user_results and regional_results map subjects to numeric scores.
+
+    Returns:
+        Optional[str]: A message for a 400 response, or None if the payload is usable
+    """
+    for field in ('user_results', 'regional_results'):
+        results = data.get(field)
+        if not isinstance(results, dict):
+            return f"{field} must be an object mapping subjects to scores."
+        for subject, score in results.items():
+            if isinstance(score, bool):
+                return f"{field}.{subject} must be a number."
+            try:
+                if not math.isfinite(float(score)):
+                    return f"{field}.{subject} must be a finite number."
+            except (TypeError, ValueError):
+                return f"{field}.{subject} must be a number."
+    return None
+
+@FunctionTimer.timer
+def generate_questions(user_results: Dict, regional_results: Dict, student_id: Optional[str] = None) -> List[Dict]:
+    """
+    Generate and parse ACT practice questions based on test results using LLaMA API
+    """
+    questions_answered = get_question_history(PINATA_JWT_TOKEN, student_id)
+
     try:
-        logger.debug(f"Sending request to API with user_results: {user_results}")
-        response = client.chat.completions.create(
+        logger.debug("Sending request to API with user_results: %s", user_results)
+        response = get_llm_client().chat.completions.create(
             model='Meta-Llama-3.1-8B-Instruct',
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an educational assistant that generates targeted practice questions based on weaknesses and test performance analysis. Return responses in JSON format. Always include necessary context for questions."
-                },
-                {"role": "user", "content": prompt}
-            ],
+            messages=build_generation_messages(user_results, regional_results, questions_answered),
             temperature=0.7,
             max_tokens=2000
         )
 
-        # Extract and clean response content
-        response_content = response.choices[0].message.content
-        cleaned_content = response_content
-        if "```json" in cleaned_content:
-            cleaned_content = cleaned_content.split("```json")[1]
-        if "```" in cleaned_content:
-            cleaned_content = cleaned_content.split("```")[0]
+        content = response.choices[0].message.content
+        save_raw_response(content)
+        return parse_generated_questions(content)
 
-        cleaned_content = cleaned_content.strip()
+    except Exception as e:
+        logger.error("Error generating questions: %s", e)
+        return error_questions(str(e))
 
-        # Parse and validate questions
-        try:
-            questions = json.loads(cleaned_content)
-            validated_questions = []
-            required_fields = {"context", "question", "options", "correct_option", "explanation", "category",
-                               "difficulty"}
-
-            for q in questions:
-                if all(field in q for field in required_fields):
-                    if isinstance(q["options"], dict) and all(opt in q["options"] for opt in ["A", "B", "C", "D"]):
-                        # Ensure context is not empty for Reading/English questions
-                        if q["category"] in ["Reading", "English"] and not q["context"].strip():
-                            logger.warning(f"Skipping question with empty context: {q}")
-                            continue
-                        validated_questions.append(q)
-                    else:
-                        logger.warning(f"Invalid options format in question: {q}")
-                else:
-                    logger.warning(f"Skipping invalid question format: {q}")
-
-            if not validated_questions:
-                logger.info("No valid questions found, attempting unstructured parsing")
-                return parse_unstructured_response(cleaned_content)
-
-            return validated_questions
-
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON parsing failed: {e}")
-            return parse_unstructured_response(cleaned_content)
+def save_raw_response(content: str) -> None:
+    """Keep a raw completion for benchmarks/bench_llm_json.py when LLM_RESPONSE_CORPUS_DIR is set."""
+    if not LLM_RESPONSE_CORPUS_DIR:
+        return
+    try:
+        os.makedirs(LLM_RESPONSE_CORPUS_DIR, exist_ok=True)
+        path = os.path.join(LLM_RESPONSE_CORPUS_DIR, f"{datetime.now():%Y%m%dT%H%M%S%f}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    except OSError as e:
+        logger.warning("Could not save raw response: %s", e)
+
+def generate_subject_question(subject: str, user_results: Dict, regional_results: Dict,
+                              questions_answered: List[Dict], timeout: float) -> Dict:
+    """
+    Generate one question for a single subject, giving up after timeout seconds.
 
-    except Exception as e:
-        logger.error(f"Error generating questions: {e}")
-        return [{"error": str(e),
-                 "context": "Error occurred",
-                 "question": "Error generating question",
-                 "options": {"A": "N/A", "B": "N/A", "C": "N/A", "D": "N/A"},
-                 "correct_option": "A",
-                 "explanation": str(e),
-                 "category": "Error",
-                 "difficulty": "N/A"}]
+    Raises:
+        ValueError: If the completion held no valid question for the subject
+    """
+    # The fan-out does its own retries, within its deadline
+    response = get_llm_client().with_options(timeout=timeout, max_retries=0).chat.completions.create(
+        model='Meta-Llama-3.1-8B-Instruct',
+        messages=build_generation_messages(user_results, regional_results, questions_answered, subject),
+        temperature=0.7,
+        max_tokens=SUBJECT_MAX_TOKENS
+    )
+    return pick_subject_question(response.choices[0].message.content, subject)
+
+def pick_subject_question(content: str, subject: str) -> Dict:
+    """
+    Return the first valid question for the given subject in a completion.
+
+    Unstructured-parse fallbacks are validated too, so a completion without a
+    usable question for the subject raises and the subject is retried.
+
+    Raises:
+        ValueError: If no question in the completion qualifies
+    """
+    for q in parse_generated_questions(content):
+        if validate_question(q) and SUBJECT_MAP.get(q['category'], q['category']) == subject:
+            return q
+    raise ValueError(f"No valid {subject} question in completion")
+
+@FunctionTimer.timer
+def generate_questions_fanout(user_results: Dict, regional_results: Dict,
+                              student_id: Optional[str] = None) -> Tuple[List[Dict], Dict[str, str]]:
+    """
+    Generate one question per subject with concurrent, independent completions.
+
+    Returns the questions that finished before FANOUT_DEADLINE (in subject
+    order) and the failure reason for each missing subject. Failed subjects
+    are retried on their own; the successful ones are not regenerated.
+    """
+    questions_answered = get_question_history(PINATA_JWT_TOKEN, student_id)
+
+    result = fan_out(
+        SUBJECTS,
+        lambda subject, timeout: generate_subject_question(subject, user_results, regional_results,
+                                                           questions_answered, timeout)
+    )
+    for subject, reason in result.failed.items():
+        logger.warning("No %s question after %d attempt(s): %s", subject, result.attempts[subject], reason)
+    logger.info("Fan-out generated %d/%d questions in %.2fs", len(result.questions), len(SUBJECTS), result.elapsed)
+
+    questions = result.ordered(SUBJECTS)
+    if not questions:
+        return error_questions("; ".join(f"{s}: {r}" for s, r in result.failed.items())), result.failed
+    return questions, result.failed
+
+def parse_generated_questions(response_content: str) -> List[Dict]:
+    """
+    Extract and validate the question list from a raw LLM completion,
+    falling back to unstructured parsing.
+    """
+    # Recovers complete objects even from a truncated or slightly malformed array
+    validated_questions = [q for q in extract_json_objects(response_content) if validate_question(q)]
+
+    if not validated_questions:
+        logger.info("No valid questions found, attempting unstructured parsing")
+        return parse_unstructured_response(response_content)
+
+    return validated_questions
+
+def error_questions(message: str) -> List[Dict]:
+    """Placeholder question set returned when generation fails."""
+    return [{"error": message,
+             "context": "Error occurred",
+             "question": "Error generating question",
+             "options": {"A": "N/A", "B": "N/A", "C": "N/A", "D": "N/A"},
+             "correct_option": "A",
+             "explanation": message,
+             "category": "Error",
+             "difficulty": "N/A"}]
+
+def stream_questions(user_results: Dict, regional_results: Dict, student_id: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream the LLM completion and yield each question as soon as it is
+    complete and passes validation.
+    """
+    questions_answered = get_question_history(PINATA_JWT_TOKEN, student_id)
+
+    logger.debug("Sending streaming request to API with user_results: %s", user_results)
+    stream = get_llm_client().chat.completions.create(
+        model='Meta-Llama-3.1-8B-Instruct',
+        messages=build_generation_messages(user_results, regional_results, questions_answered),
+        temperature=0.7,
+        max_tokens=2000,
+        stream=True
+    )
+    yield from iter_array_objects(completion_deltas(stream), validator=validate_question,
+                                  fallback=parse_unstructured_response)
 
 @FunctionTimer.timer
 def parse_unstructured_response(response_text: str) -> List[Dict]:
     """
     Enhanced fallback parser for unstructured text responses
     """
-    logger.debug(f"Parsing unstructured response: {response_text}")
+    logger.debug("Parsing unstructured response: %s", payload(response_text))
     questions = []
     current_question = {}
     current_options = {}
@@ -342,8 +464,6 @@ def parse_unstructured_response(response_text: str) -> List[Dict]:
         if not line:
             continue
 
-        logger.debug(f"Processing line: {line}")
-
         if any(line.lower().startswith(start) for start in ['q:', 'question:', 'problem:']):
             if current_question and current_question.get('question'):
                 current_question['options'] = current_options
@@ -381,7 +501,7 @@ def parse_unstructured_response(response_text: str) -> List[Dict]:
         current_question['options'] = current_options
         questions.append(current_question)
 
-    logger.debug(f"Parsed questions: {questions}")
+    logger.debug("Parsed questions: %s", payload(questions))
     return questions if questions else [{"question": "Failed to generate questions",
                                          "options": {"A": "N/A", "B": "N/A", "C": "N/A", "D": "N/A"},
                                          "correct_option": "A",
@@ -439,24 +559,123 @@ def create_questions():
             return jsonify({
                 'error': 'Missing required fields. Please provide user_results and regional_results.'
             }), 400
-
-        questions = generate_questions(
-            data['user_results'],
-            data['regional_results']
-        )
-
-        return jsonify({
+        payload_error = score_payload_error(data)
+        if payload_error:
+            return jsonify({'error': payload_error}), 400
+
+        # Near-identical score profiles share cached sets; a student is never served one twice
+        generation_cache = get_generation_cache()
+        cache_key = profile_key(data['user_results'], data['regional_results'], PROMPT_VERSION)
+        viewer = data.get('student_id')
+
+        def generate_and_cache() -> Tuple[List[Dict], Dict[str, str], Optional[int]]:
+            if GENERATION_MODE == 'fanout':
+                generated, missing = generate_questions_fanout(data['user_results'], data['regional_results'], viewer)
+            else:
+                generated, missing = generate_questions(data['user_results'], data['regional_results'], viewer), {}
+            # Partial fan-out sets are served but not cached
+            variant_id = None
+            if not missing and is_cacheable(generated):
+                variant_id = generation_cache.put(cache_key, generated, viewer)
+            return generated, missing, variant_id
+
+        questions, missing = generation_cache.get(cache_key, viewer), {}
+        if questions is None:
+            # Requests for the same profile arriving together (a class logging in at once)
+            # share one LLM call, which uses the first caller's answer history
+            questions, missing, variant_id = generation_flight.do(cache_key, generate_and_cache)
+            if variant_id is not None:
+                # Coalesced callers were served the set too; never serve it to them again
+                generation_cache.mark_seen(cache_key, variant_id, viewer)
+
+        body = {
             'status': 'success',
             'questions': questions
-        })
+        }
+        if missing:
+            body['missing_subjects'] = missing
+        return jsonify(body)
     except Exception as e:
-        logger.error(f"Error in create_questions: {e}")
+        logger.error("Error in create_questions: %s", e)
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
 
+@app.route('/generate-questions/stream', methods=['POST'])
+def stream_create_questions():
+    """
+    Streaming variant of /generate-questions.
+
+    Responds with NDJSON: one {"question": ...} line per validated question
+    as soon as it is generated, then a final {"status": ...} line.
+    """
+    data = request.get_json()
+
+    if not data or 'user_results' not in data or 'regional_results' not in data:
+        return jsonify({
+            'error': 'Missing required fields. Please provide user_results and regional_results.'
+        }), 400
+    payload_error = score_payload_error(data)
+    if payload_error:
+        return jsonify({'error': payload_error}), 400
+
+    generation_cache = get_generation_cache()
+    cache_key = profile_key(data['user_results'], data['regional_results'], PROMPT_VERSION)
+    viewer = data.get('student_id')
+
+    def generate():
+        questions = generation_cache.get(cache_key, viewer)
+        from_cache = questions is not None
+        try:
+            source = iter(questions) if from_cache else stream_questions(
+                data['user_results'],
+                data['regional_results'],
+                viewer
+            )
+            streamed = []
+            for question in source:
+                streamed.append(question)
+                yield json.dumps({'question': question}) + '\n'
+
+            if not from_cache and is_cacheable(streamed):
+                generation_cache.put(cache_key, streamed, viewer)
+            yield json.dumps({'status': 'success', 'count': len(streamed)}) + '\n'
+        except Exception as e:
+            logger.error("Error in stream_create_questions: %s", e)
+            yield json.dumps({'status': 'error', 'message': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the CID content and question generation caches"""
+    return jsonify({
+        'cid': get_cid_cache().stats(),
+        'generation': get_generation_cache().stats()
+    })
+
+
+@app.route('/http-stats', methods=['GET'])
+def http_stats():
+    """Connection pool usage and retry counts per upstream host"""
+    return jsonify(get_http_client().stats())
+
+
+@app.route('/coalescing-stats', methods=['GET'])
+def coalescing_stats():
+    """Upstream executions vs. coalesced requests per single-flight group"""
+    return jsonify(singleflight_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Function and route latency percentiles in Prometheus text format"""
+    return Response(render_prometheus(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.route('/health', methods=['GET'])
 @FunctionTimer.timer
 def health_check():
@@ -465,4 +684,5 @@ def health_check():
 
 
 if __name__ == '__main__':
+    # Single-process development server; in production run `gunicorn app:app` (see gunicorn.conf.py)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,329 @@
+"""
+Async serving mode for the generation API.
+
+Same routes as app.py, but served by Quart on an ASGI server: route
+handlers, the LLM client and gateway reads are all async, so one process
+can keep hundreds of generation requests in flight without a thread each.
+
+Run with:
+    python asgi_app.py
+or
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from quart import Quart, Response, g, jsonify, request
+
+from app import (
+    GENERATION_MODE,
+    PINATA_JWT_TOKEN,
+    PROMPT_VERSION,
+    FunctionTimer,
+    build_generation_messages,
+    error_questions,
+    parse_generated_questions,
+    parse_unstructured_response,
+    pick_subject_question,
+    score_payload_error,
+    validate_question,
+)
+from cid_cache import get_cid_cache
+from generation_cache import get_generation_cache, is_cacheable, profile_key
+from http_client import (CONNECT_TIMEOUT, PINATA_GATEWAY_HOST, PINATA_GATEWAY_URL, POOL_SIZES, READ_TIMEOUT,
+                         async_request)
+from llm_client import new_async_llm_client
+from llm_json import acompletion_deltas, aiter_array_objects
+from metrics import PROMETHEUS_CONTENT_TYPE, observe_request, render_prometheus
+from pin_index import sync_pin_index
+from pinata_fetch import DEFAULT_MAX_WORKERS
+from singleflight import get_async_singleflight, singleflight_stats
+from subject_fanout import SUBJECT_MAX_TOKENS, afan_out
+from subjects import SUBJECTS
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+
+# Concurrent requests for the same history or payload share one upstream call
+history_flight = get_async_singleflight("pinata_history_async")
+generation_flight = get_async_singleflight("generate_questions_async")
+
+# Created on startup so they bind to the server's event loop
+async_client = None
+http_client: Optional[httpx.AsyncClient] = None
+gateway_semaphore: Optional[asyncio.Semaphore] = None
+
+
+@app.before_serving
+async def startup():
+    global async_client, http_client, gateway_semaphore
+    async_client = new_async_llm_client()
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_keepalive_connections=POOL_SIZES[PINATA_GATEWAY_HOST])
+    )
+    gateway_semaphore = asyncio.Semaphore(DEFAULT_MAX_WORKERS)
+
+
+@app.after_serving
+async def shutdown():
+    await http_client.aclose()
+    await async_client.close()
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    # Streaming responses are timed to their first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(route, request.method, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
+
+async def get_file_content(cid: str) -> Optional[Dict]:
+    """Async gateway read of a CID, through the shared CID cache."""
+    # Cache reads and writes are SQLite statements; keep them off the event loop
+    cache = get_cid_cache()
+    cached = await asyncio.to_thread(cache.get, cid)
+    if cached is not None:
+        return cached
+
+    try:
+        async with gateway_semaphore:
+            response = await async_request(http_client, 'GET', f"{PINATA_GATEWAY_URL}/ipfs/{cid}")
+        response.raise_for_status()
+        content = response.json()
+        await asyncio.to_thread(cache.put, cid, content)
+        return content
+    except Exception as e:
+        logger.warning("Error getting file content for %s: %s", cid, e)
+        return None
+
+
+@FunctionTimer.timer
+async def get_pinata_questions(jwt_token: str, student_id: Optional[str] = None) -> List[Dict]:
+    """Async counterpart of app.get_pinata_questions (last 3 pins)."""
+    try:
+        # The pin index is a local SQLite mirror; its sync and reads run off the event loop
+        index = await asyncio.to_thread(sync_pin_index, jwt_token, student_id)
+        rows = await asyncio.to_thread(index.latest, 3, student_id)
+
+        contents = await asyncio.gather(*(get_file_content(row['ipfs_pin_hash']) for row in rows))
+        all_questions = []
+        for content in contents:
+            if isinstance(content, list):
+                all_questions.extend(content)
+            elif isinstance(content, dict):
+                all_questions.append(content)
+        return all_questions
+
+    except Exception as e:
+        logger.warning("Error getting pinned questions: %s", e)
+        return []
+
+
+async def get_question_history(jwt_token: str, student_id: Optional[str] = None) -> List[Dict]:
+    """get_pinata_questions, coalesced across concurrent requests for the same student."""
+    return await history_flight.do((jwt_token, student_id), lambda: get_pinata_questions(jwt_token, student_id))
+
+
+@FunctionTimer.timer
+async def generate_questions(user_results: Dict, regional_results: Dict, student_id: Optional[str] = None) -> List[Dict]:
+    """Async counterpart of app.generate_questions."""
+    questions_answered = await get_question_history(PINATA_JWT_TOKEN, student_id)
+
+    try:
+        response = await async_client.chat.completions.create(
+            model='Meta-Llama-3.1-8B-Instruct',
+            messages=build_generation_messages(user_results, regional_results, questions_answered),
+            temperature=0.7,
+            max_tokens=2000
+        )
+        return parse_generated_questions(response.choices[0].message.content)
+
+    except Exception as e:
+        logger.error("Error generating questions: %s", e)
+        return error_questions(str(e))
+
+
+async def generate_subject_question(subject: str, user_results: Dict, regional_results: Dict,
+                                    questions_answered: List[Dict], timeout: float) -> Dict:
+    """Async counterpart of app.generate_subject_question."""
+    response = await async_client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+        model='Meta-Llama-3.1-8B-Instruct',
+        messages=build_generation_messages(user_results, regional_results, questions_answered, subject),
+        temperature=0.7,
+        max_tokens=SUBJECT_MAX_TOKENS
+    )
+    return pick_subject_question(response.choices[0].message.content, subject)
+
+
+@FunctionTimer.timer
+async def generate_questions_fanout(user_results: Dict, regional_results: Dict,
+                                    student_id: Optional[str] = None) -> Tuple[List[Dict], Dict[str, str]]:
+    """Async counterpart of app.generate_questions_fanout."""
+    questions_answered = await get_question_history(PINATA_JWT_TOKEN, student_id)
+
+    result = await afan_out(
+        SUBJECTS,
+        lambda subject, timeout: generate_subject_question(subject, user_results, regional_results,
+                                                           questions_answered, timeout)
+    )
+    for subject, reason in result.failed.items():
+        logger.warning("No %s question after %d attempt(s): %s", subject, result.attempts[subject], reason)
+
+    questions = result.ordered(SUBJECTS)
+    if not questions:
+        return error_questions("; ".join(f"{s}: {r}" for s, r in result.failed.items())), result.failed
+    return questions, result.failed
+
+
+def missing_fields_response():
+    return jsonify({
+        'error': 'Missing required fields. Please provide user_results and regional_results.'
+    }), 400
+
+
+@app.route('/generate-questions', methods=['POST'])
+async def create_questions():
+    """API endpoint to generate questions"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'user_results' not in data or 'regional_results' not in data:
+            return missing_fields_response()
+        payload_error = score_payload_error(data)
+        if payload_error:
+            return jsonify({'error': payload_error}), 400
+
+        generation_cache = get_generation_cache()
+        cache_key = profile_key(data['user_results'], data['regional_results'], PROMPT_VERSION)
+        viewer = data.get('student_id')
+
+        async def generate_and_cache() -> Tuple[List[Dict], Dict[str, str], Optional[int]]:
+            if GENERATION_MODE == 'fanout':
+                generated, missing = await generate_questions_fanout(data['user_results'], data['regional_results'], viewer)
+            else:
+                generated, missing = await generate_questions(data['user_results'], data['regional_results'], viewer), {}
+            # Partial fan-out sets are served but not cached
+            variant_id = None
+            if not missing and is_cacheable(generated):
+                variant_id = await asyncio.to_thread(generation_cache.put, cache_key, generated, viewer)
+            return generated, missing, variant_id
+
+        questions, missing = await asyncio.to_thread(generation_cache.get, cache_key, viewer), {}
+        if questions is None:
+            # Requests for the same profile arriving together share one LLM call (see app.py)
+            questions, missing, variant_id = await generation_flight.do(cache_key, generate_and_cache)
+            if variant_id is not None:
+                await asyncio.to_thread(generation_cache.mark_seen, cache_key, variant_id, viewer)
+
+        body = {
+            'status': 'success',
+            'questions': questions
+        }
+        if missing:
+            body['missing_subjects'] = missing
+        return jsonify(body)
+    except Exception as e:
+        logger.error("Error in create_questions: %s", e)
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/generate-questions/stream', methods=['POST'])
+async def stream_create_questions():
+    """Streaming variant of /generate-questions (NDJSON, see app.py)."""
+    data = await request.get_json()
+
+    if not data or 'user_results' not in data or 'regional_results' not in data:
+        return missing_fields_response()
+    payload_error = score_payload_error(data)
+    if payload_error:
+        return jsonify({'error': payload_error}), 400
+
+    generation_cache = get_generation_cache()
+    cache_key = profile_key(data['user_results'], data['regional_results'], PROMPT_VERSION)
+    viewer = data.get('student_id')
+
+    async def generate():
+        cached = await asyncio.to_thread(generation_cache.get, cache_key, viewer)
+        streamed = []
+        try:
+            if cached is not None:
+                for question in cached:
+                    streamed.append(question)
+                    yield json.dumps({'question': question}) + '\n'
+            else:
+                questions_answered = await get_question_history(PINATA_JWT_TOKEN, viewer)
+                stream = await async_client.chat.completions.create(
+                    model='Meta-Llama-3.1-8B-Instruct',
+                    messages=build_generation_messages(data['user_results'], data['regional_results'],
+                                                       questions_answered),
+                    temperature=0.7,
+                    max_tokens=2000,
+                    stream=True
+                )
+                async for question in aiter_array_objects(acompletion_deltas(stream), validator=validate_question,
+                                                          fallback=parse_unstructured_response):
+                    streamed.append(question)
+                    yield json.dumps({'question': question}) + '\n'
+
+                if is_cacheable(streamed):
+                    await asyncio.to_thread(generation_cache.put, cache_key, streamed, viewer)
+            yield json.dumps({'status': 'success', 'count': len(streamed)}) + '\n'
+        except Exception as e:
+            logger.error("Error in stream_create_questions: %s", e)
+            yield json.dumps({'status': 'error', 'message': str(e)}) + '\n'
+
+    return generate(), 200, {'Content-Type': 'application/x-ndjson'}
+
+
+@app.route('/cache-stats', methods=['GET'])
+async def cache_stats():
+    """Hit/miss counters for the CID content and question generation caches"""
+    return jsonify({
+        'cid': await asyncio.to_thread(get_cid_cache().stats),
+        'generation': await asyncio.to_thread(get_generation_cache().stats)
+    })
+
+
+@app.route('/coalescing-stats', methods=['GET'])
+async def coalescing_stats():
+    """Upstream executions vs. coalesced requests per single-flight group"""
+    return jsonify(singleflight_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Function and route latency percentiles in Prometheus text format"""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({'status': 'healthy'})
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(
+        "asgi_app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        log_level=os.getenv("LOG_LEVEL", "info").lower()
+    )
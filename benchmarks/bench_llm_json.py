@@ -0,0 +1,98 @@
+"""
+Throughput and recovery rate of llm_json.extract_json_objects over a corpus
+of saved raw LLM responses, compared with the old fence-splitting parser.
+
+Usage:
+    python benchmarks/bench_llm_json.py [corpus_dir] [--iterations N]
+
+The default corpus is benchmarks/corpus/llm_responses. Set
+LLM_RESPONSE_CORPUS_DIR when running app.py to save real completions into a
+directory that can be passed here.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import validate_question  # noqa: E402
+from llm_json import extract_json_objects  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "llm_responses")
+
+
+def legacy_parse(text: str) -> List[Dict]:
+    """The ```json split + json.loads parsing used before extract_json_objects."""
+    if "```json" in text:
+        text = text.split("```json")[1]
+    if "```" in text:
+        text = text.split("```")[0]
+    try:
+        questions = json.loads(text.strip())
+    except json.JSONDecodeError:
+        return []
+    return questions if isinstance(questions, list) else []
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, str]:
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith(('.txt', '.json')):
+            with open(os.path.join(corpus_dir, name), encoding='utf-8') as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def valid_count(parse: Callable[[str], List[Dict]], text: str) -> int:
+    return sum(1 for q in parse(text) if validate_question(q))
+
+
+def throughput(parse: Callable[[str], List[Dict]], texts: List[str], iterations: int) -> float:
+    """Megabytes of response text parsed per second."""
+    total_bytes = sum(len(t.encode('utf-8')) for t in texts) * iterations
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            parse(text)
+    return total_bytes / (time.perf_counter() - start) / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('corpus_dir', nargs='?', default=DEFAULT_CORPUS)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    # validate_question logs every rejected object
+    logging.disable(logging.WARNING)
+
+    corpus = load_corpus(args.corpus_dir)
+    if not corpus:
+        sys.exit(f"No .txt/.json responses in {args.corpus_dir}")
+
+    print(f"{'response':<36} {'legacy':>7} {'extract':>8}")
+    legacy_total = extract_total = legacy_hits = extract_hits = 0
+    for name, text in corpus.items():
+        legacy = valid_count(legacy_parse, text)
+        extracted = valid_count(extract_json_objects, text)
+        legacy_total += legacy
+        extract_total += extracted
+        legacy_hits += legacy > 0
+        extract_hits += extracted > 0
+        print(f"{name:<36} {legacy:>7} {extracted:>8}")
+
+    texts = list(corpus.values())
+    print()
+    print(f"Responses with >=1 valid question: legacy {legacy_hits}/{len(corpus)}, "
+          f"extract {extract_hits}/{len(corpus)}")
+    print(f"Valid questions recovered:         legacy {legacy_total}, extract {extract_total}")
+    print(f"Throughput (MB/s):                 legacy {throughput(legacy_parse, texts, args.iterations):.2f}, "
+          f"extract {throughput(extract_json_objects, texts, args.iterations):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""
+Offline load test for the Flask app.
+
+Starts the Pinata and SambaNova stand-ins (benchmarks/standins.py), launches
+app.py against them in a scratch directory, then drives one endpoint at each
+of a series of fixed request rates. Arrivals are open-loop: requests are
+sent on schedule whether or not earlier ones have finished, and latency is
+measured from the scheduled send time so a saturated server shows up as
+growing latency instead of a lower request rate.
+
+Optionally also measures how the analytics page's score replay scales with
+history size (--analytics-sizes), by replaying N synthetic pins cold and then
+warm from the checkpoint.
+
+Writes a JSON report; --compare prints the change against an earlier one.
+
+Usage:
+    python benchmarks/loadtest.py --rates 1,2,5 --duration 20 --output run.json
+    python benchmarks/loadtest.py --rates 5 --llm-error-rate 0.05 --compare run.json
+    python benchmarks/loadtest.py --rates 0 --analytics-sizes 100,1000,5000
+    python benchmarks/loadtest.py --rates 20,40,80 --workers 4   # gunicorn, see gunicorn.conf.py
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standins import SUBJECTS, add_service_arguments, service_configs, start_standins  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+COMPARE_KEYS = ("throughput_rps", "error_rate", "latency_p50_ms", "latency_p99_ms")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def app_environment(urls: Dict[str, str], workdir: str, extra: Dict[str, str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "PINATA_API_URL": urls['pinata_api'],
+        "PINATA_GATEWAY_URL": urls['gateway'],
+        "SAMBANOVA_BASE_URL": urls['llm'],
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        # Keep every file the app writes out of the checkout
+        "PIN_INDEX_DIR": os.path.join(workdir, "data"),
+        "CID_CACHE_PATH": os.path.join(workdir, "data", "cid_cache.sqlite3"),
+        "SCORE_CHECKPOINT_PATH": os.path.join(workdir, "data", "score_checkpoint.json"),
+    })
+    env.update(extra)
+    return env
+
+
+def start_app(env: Dict[str, str], workdir: str, workers: int = 0, timeout: float = 30.0) -> subprocess.Popen:
+    """
+    Run app.py under Flask's threaded server, or under gunicorn with that
+    many pre-forked workers, and wait until /health answers.
+    """
+    port = free_port()
+    if workers:
+        command = [sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO_ROOT, "gunicorn.conf.py"),
+                   "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "app:app"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run",
+                   "--host", "127.0.0.1", "--port", str(port), "--no-reload", "--no-debugger", "--with-threads"]
+    process = subprocess.Popen(
+        command,
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "app.log"), "w")
+    )
+    process.url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with {process.returncode}; see {workdir}/app.log")
+        try:
+            if requests.get(process.url + "/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"app did not become healthy within {timeout}s; see {workdir}/app.log")
+
+
+class PayloadFactory:
+    """
+    Request bodies drawn from a pool of score profiles (0 = a fresh profile
+    every request), each for a student drawn from the stand-in's loadtest-1..N
+    (0 = no student, i.e. the whole account's history).
+    """
+
+    def __init__(self, profiles: int, students: int = 0, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pool = [self._profile() for _ in range(profiles)]
+        self.students = students
+
+    def _profile(self) -> Dict:
+        return {
+            "user_results": {subject: self.rng.randint(1, 36) for subject in SUBJECTS},
+            "regional_results": {subject: self.rng.randint(12, 30) for subject in SUBJECTS},
+        }
+
+    def next(self) -> Dict:
+        with self.lock:
+            profile = self.rng.choice(self.pool) if self.pool else self._profile()
+            if not self.students:
+                return dict(profile)
+            return dict(profile, student_id=f"loadtest-{self.rng.randint(1, self.students)}")
+
+
+def classify(response: requests.Response, stream: bool) -> str:
+    """Outcome label for one response: ok, partial, error_questions or http_<status>."""
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    if stream:
+        lines = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+        final = lines[-1] if lines else {}
+        if final.get('status') != 'success':
+            return "stream_error"
+        return "ok" if final.get('count') == len(SUBJECTS) else "partial"
+    body = response.json()
+    questions = body.get('questions') or []
+    if any(q.get('category') == 'Error' for q in questions):
+        return "error_questions"
+    if body.get('missing_subjects'):
+        return "partial"
+    return "ok"
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_step(base_url: str, endpoint: str, rate: float, duration: float,
+             payloads: PayloadFactory, max_inflight: int, timeout: float) -> Dict:
+    """Drive endpoint at a fixed arrival rate for duration seconds."""
+    stream = endpoint.endswith('/stream')
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max_inflight))
+    results = []
+    results_lock = threading.Lock()
+    inflight = threading.Semaphore(max_inflight)
+    outcomes = Counter()
+
+    def send(scheduled: float) -> None:
+        try:
+            body = payloads.next()
+            if endpoint == '/health':
+                response = session.get(base_url + endpoint, timeout=timeout)
+            else:
+                response = session.post(base_url + endpoint, json=body, timeout=timeout)
+            outcome = classify(response, stream)
+        except requests.Timeout:
+            outcome = "timeout"
+        except requests.ConnectionError:
+            outcome = "connection_error"
+        except (requests.RequestException, ValueError):
+            outcome = "bad_response"
+        finally:
+            inflight.release()
+        latency = time.perf_counter() - scheduled
+        with results_lock:
+            results.append((outcome, latency))
+
+    total = int(rate * duration)
+    start = time.perf_counter() + 0.1
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="loadtest") as executor:
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not inflight.acquire(blocking=False):
+                # More than max_inflight outstanding: the client, not the app, is the limit
+                outcomes["client_saturated"] += 1
+                continue
+            executor.submit(send, scheduled)
+    elapsed = time.perf_counter() - start
+
+    outcomes.update(outcome for outcome, _ in results)
+    ok_latencies = sorted(latency for outcome, latency in results if outcome == "ok")
+    all_latencies = sorted(latency for _, latency in results)
+    report = {
+        "offered_rps": rate,
+        "duration_s": round(elapsed, 3),
+        "scheduled": total,
+        "completed": len(results),
+        "ok": len(ok_latencies),
+        "throughput_rps": round(len(ok_latencies) / elapsed, 3),
+        "error_rate": round(1 - len(ok_latencies) / total, 4) if total else 0.0,
+        "outcomes": dict(outcomes),
+    }
+    for p in PERCENTILES:
+        value = percentile(ok_latencies, p)
+        report[f"latency_p{p}_ms"] = round(value * 1000, 1) if value is not None else None
+    report["latency_max_ms"] = round(all_latencies[-1] * 1000, 1) if all_latencies else None
+    report["latency_mean_ms"] = round(sum(ok_latencies) / len(ok_latencies) * 1000, 1) if ok_latencies else None
+    return report
+
+
+def snapshot(base_url: str, path: str) -> Optional[Dict]:
+    try:
+        return requests.get(base_url + path, timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def snapshot_text(base_url: str, path: str) -> Optional[str]:
+    try:
+        return requests.get(base_url + path, timeout=5).text
+    except requests.RequestException:
+        return None
+
+
+def analytics_probe() -> None:
+    """Child-process entry point: time a cold and a warm analytics replay, print JSON."""
+    spec = importlib.util.spec_from_file_location("analytics_page", os.path.join(REPO_ROOT, "pages", "analytics.py"))
+    analytics = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(analytics)
+    from app import PINATA_JWT_TOKEN
+
+    start = time.perf_counter()
+    cold = analytics.load_replay_state(PINATA_JWT_TOKEN, full_replay=True)
+    cold_s = time.perf_counter() - start
+    start = time.perf_counter()
+    analytics.load_replay_state(PINATA_JWT_TOKEN)
+    warm_s = time.perf_counter() - start
+    print(json.dumps({
+        "answers": len(cold) if cold is not None else None,
+        "cold_replay_s": round(cold_s, 3),
+        "warm_replay_s": round(warm_s, 3),
+    }))
+
+
+def run_analytics(urls: Dict[str, str], sizes: List[int], extra_env: Dict[str, str]) -> List[Dict]:
+    """Replay N pins through the analytics page code for each N, in a fresh process and directory."""
+    reports = []
+    for size in sizes:
+        requests.post(urls['pinata_api'] + "/__reset", json={"pins": size}, timeout=30).raise_for_status()
+        with tempfile.TemporaryDirectory(prefix="loadtest-analytics-") as workdir:
+            env = app_environment(urls, workdir, extra_env)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--analytics-probe"],
+                                    cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+        report = dict(json.loads(output.strip().splitlines()[-1]), pins=size)
+        print(f"analytics pins={size}: cold {report['cold_replay_s']}s, warm {report['warm_replay_s']}s",
+              file=sys.stderr)
+        reports.append(report)
+    return reports
+
+
+def compare(current: Dict, baseline: Dict) -> None:
+    """Print per-rate deltas of the headline numbers against an earlier report."""
+    before = {step['offered_rps']: step for step in baseline.get('steps', [])}
+    print(f"{'rps':>6} " + " ".join(f"{key:>30}" for key in COMPARE_KEYS))
+    for step in current.get('steps', []):
+        old = before.get(step['offered_rps'])
+        if old is None:
+            continue
+        cells = []
+        for key in COMPARE_KEYS:
+            new_value, old_value = step.get(key), old.get(key)
+            if new_value is None or old_value is None:
+                cells.append(f"{'n/a':>30}")
+                continue
+            change = f" ({(new_value - old_value) / old_value:+.0%})" if old_value else ""
+            cells.append(f"{f'{old_value} -> {new_value}{change}':>30}")
+        print(f"{step['offered_rps']:>6} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="1,2,5", help="Comma-separated request rates (req/s); 0 skips")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per rate step")
+    parser.add_argument("--endpoint", default="/generate-questions",
+                        choices=["/generate-questions", "/generate-questions/stream", "/health"])
+    parser.add_argument("--generation-mode", default="single", choices=["single", "fanout"])
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Serve with gunicorn and this many workers (0 = Flask's threaded dev server)")
+    parser.add_argument("--profiles", type=int, default=0,
+                        help="Distinct score profiles to draw from (0 = new profile per request, "
+                             "so the generation cache rarely hits)")
+    parser.add_argument("--pins", type=int, default=200, help="Pinned answers in the Pinata stand-in")
+    parser.add_argument("--students", type=int, default=10,
+                        help="Students the pins are spread over and requests are drawn from "
+                             "(0 = untagged pins, requests read the whole account's history)")
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--analytics-sizes", default="", help="Comma-separated history sizes to replay")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the app, e.g. FANOUT_DEADLINE=5")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--analytics-probe", action="store_true", help=argparse.SUPPRESS)
+    add_service_arguments(parser)
+    args = parser.parse_args()
+
+    if args.analytics_probe:
+        return analytics_probe()
+
+    rates = [float(r) for r in args.rates.split(',') if r and float(r) > 0]
+    sizes = [int(s) for s in args.analytics_sizes.split(',') if s]
+    extra_env = dict(item.split('=', 1) for item in args.app_env)
+    extra_env.setdefault("GENERATION_MODE", args.generation_mode)
+
+    urls, servers = start_standins(service_configs(args), args.pins, args.students)
+    report = {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(),
+            "endpoint": args.endpoint,
+            "workers": args.workers,
+            "duration_per_step_s": args.duration,
+            "profiles": args.profiles,
+            "pins": args.pins,
+            "students": args.students,
+            "app_env": extra_env,
+            "standins": {name: {"latency": config.latency, "error_rate": config.error_rate}
+                         for name, config in service_configs(args).items()},
+        },
+        "steps": [],
+    }
+    try:
+        if rates:
+            with tempfile.TemporaryDirectory(prefix="loadtest-app-") as workdir:
+                app = start_app(app_environment(urls, workdir, extra_env), workdir, args.workers)
+                try:
+                    payloads = PayloadFactory(args.profiles, args.students)
+                    for rate in rates:
+                        step = run_step(app.url, args.endpoint, rate, args.duration, payloads,
+                                        args.max_inflight, args.timeout)
+                        report["steps"].append(step)
+                        print(f"{rate:g} req/s: {step['throughput_rps']} ok/s, "
+                              f"p50 {step['latency_p50_ms']} ms, p99 {step['latency_p99_ms']} ms, "
+                              f"outcomes {step['outcomes']}", file=sys.stderr)
+                    if args.workers:
+                        # Other workers' metrics reach /metrics on their next flush
+                        time.sleep(float(extra_env.get("METRICS_FLUSH_SECONDS", 1)) + 0.5)
+                    report["app"] = {path.strip('/'): snapshot(app.url, path)
+                                     for path in ("/cache-stats", "/coalescing-stats", "/http-stats")}
+                    report["app"]["metrics"] = snapshot_text(app.url, "/metrics")
+                finally:
+                    app.terminate()
+                    app.wait(timeout=10)
+        report["upstream"] = {name: snapshot(url.rsplit('/v1', 1)[0], "/__stats")
+                              for name, url in urls.items()}
+        if sizes:
+            report["analytics"] = run_analytics(urls, sizes, extra_env)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
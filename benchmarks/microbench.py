@@ -0,0 +1,282 @@
+"""
+Microbenchmarks for the parsing and scoring hot paths, with a stored
+baseline and a regression gate.
+
+Cases:
+    parse_generated_questions  extraction + validation loop of generate_questions, per corpus file kind
+    parse_unstructured_response  fallback parser over the corpus
+    validate_question          validation of N generated question dicts
+    calculate_score_change     N score updates
+    process_questions          full replay of N answer records
+    create_progression_graph   chart build from a replay of N answers
+
+Answer fixtures are generated deterministically at 1k/100k/1M records;
+LLM output fixtures come from benchmarks/corpus/llm_responses (clean, fenced,
+truncated, unstructured, ...). Each case runs once untimed to warm up, then
+reports its best wall time over at least MIN_REPEATS timed repeats and, from
+a separate tracemalloc run, its peak allocation.
+
+Usage:
+    python benchmarks/microbench.py --save-baseline          # record benchmarks/baseline.json
+    python benchmarks/microbench.py                          # compare; exit 1 on regression
+    python benchmarks/microbench.py --sizes 1k,100k --only process --threshold 0.1
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from app import parse_generated_questions, parse_unstructured_response, validate_question  # noqa: E402
+from subjects import SUBJECT_MAP  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus", "llm_responses")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.20"))
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+# Corpus passes per timed run, so each run is long enough to time reliably
+CORPUS_PASSES = 50
+# Smaller absolute changes are timer/allocator noise, whatever the percentage
+NOISE_FLOOR = {"time_s": 0.001, "peak_kib": 64.0}
+# Time each case at least MIN_REPEATS times, then keep repeating until this
+# much time is spent on it (or --repeats is reached)
+MIN_REPEATS = 5
+MIN_CASE_SECONDS = 1.0
+
+# Answer keys as the Streamlit pages record them, including the short 'Math' alias
+ANSWER_SUBJECTS = list(SUBJECT_MAP)
+DIFFICULTIES = ["easy", "medium", "hard", "Hard", "unknown"]
+
+
+def load_analytics():
+    """Import pages/analytics.py (not a package) for its scoring functions."""
+    spec = importlib.util.spec_from_file_location("analytics_page", os.path.join(REPO_ROOT, "pages", "analytics.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_answers(count: int, seed: int = 0) -> List[Dict]:
+    """Deterministic answer records, shuffled so the replay's sort has work to do."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    answers = [
+        {
+            "timestamp": (start + timedelta(seconds=37 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "subject": rng.choice(ANSWER_SUBJECTS),
+            "difficulty": rng.choice(DIFFICULTIES),
+            "correct": rng.random() < 0.6,
+        }
+        for i in range(count)
+    ]
+    rng.shuffle(answers)
+    return answers
+
+
+def make_questions(count: int, seed: int = 0) -> List[Dict]:
+    """N question dicts drawn from a small pool of valid and invalid shapes."""
+    rng = random.Random(seed)
+    pool = []
+    for i in range(64):
+        question = {
+            "context": "" if i % 16 == 0 else "Passage text " * 20,
+            "question": f"Question {i}?",
+            "options": {letter: f"Option {letter}" for letter in ("ABCD" if i % 8 else "ABC")},
+            "correct_option": "ABCD"[i % 4],
+            "explanation": "Because.",
+            "category": ["Mathematics", "Reading", "Science", "English"][i % 4],
+            "difficulty": "Medium",
+        }
+        if i % 32 == 5:
+            del question["explanation"]
+        pool.append(question)
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def load_corpus(kind: Optional[str] = None) -> List[str]:
+    texts = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith('.txt') and (kind is None or kind in name):
+            with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+                texts.append(f.read())
+    return texts
+
+
+@dataclass
+class Case:
+    """One benchmark: setup() builds the fixture (untimed), run(fixture) is measured."""
+    name: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+
+
+def build_cases(sizes: List[str]) -> List[Case]:
+    analytics = load_analytics()
+    cases = []
+
+    def corpus_runner(parse: Callable[[str], Any]) -> Callable[[List[str]], None]:
+        def run(texts: List[str]) -> None:
+            for _ in range(CORPUS_PASSES):
+                for text in texts:
+                    parse(text)
+        return run
+
+    for kind in ("clean", "fenced", "truncated", "unstructured", None):
+        label = kind or "all"
+        cases.append(Case(f"parse_generated_questions[{label}]",
+                          lambda kind=kind: load_corpus(kind), corpus_runner(parse_generated_questions)))
+    cases.append(Case("parse_unstructured_response[all]", load_corpus, corpus_runner(parse_unstructured_response)))
+
+    def score_changes(answers: List[Dict]) -> float:
+        score = 13.0
+        for answer in answers:
+            score = max(0.0, score + analytics.calculate_score_change(answer, score))
+        return score
+
+    for label in sizes:
+        n = SIZES[label]
+        cases.append(Case(f"validate_question[{label}]", lambda n=n: make_questions(n),
+                          lambda questions: [q for q in questions if validate_question(q)]))
+        cases.append(Case(f"calculate_score_change[{label}]", lambda n=n: make_answers(n), score_changes))
+        cases.append(Case(f"process_questions[{label}]", lambda n=n: make_answers(n), analytics.process_questions))
+        cases.append(Case(f"create_progression_graph[{label}]",
+                          lambda n=n: analytics.process_questions(make_answers(n)),
+                          analytics.create_progression_graph))
+    return cases
+
+
+def measure(case: Case, max_repeats: int, min_repeats: int = MIN_REPEATS) -> Dict:
+    fixture = case.setup()
+    # Untimed warm-up: first-call costs (imports, caches, lazy init) are not what we track
+    case.run(fixture)
+    gc.collect()
+
+    timings = []
+    spent = 0.0
+    while len(timings) < min_repeats or (len(timings) < max_repeats and spent < MIN_CASE_SECONDS):
+        start = time.perf_counter()
+        case.run(fixture)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+
+    # Separate run: tracemalloc slows execution too much to time under it
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run(fixture)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "time_s": round(min(timings), 6),
+        "median_s": round(sorted(timings)[len(timings) // 2], 6),
+        "repeats": len(timings),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def find_regressions(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                     threshold: float, memory_threshold: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        for key, limit in (("time_s", threshold), ("peak_kib", memory_threshold)):
+            if not old.get(key) or result[key] - old[key] < NOISE_FLOOR[key]:
+                continue
+            if result[key] > old[key] * (1 + limit):
+                regressions.append(f"{name}: {key} {old[key]} -> {result[key]} "
+                                   f"({result[key] / old[key] - 1:+.0%}, limit {limit:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k,1m", help="Answer fixture sizes: any of 1k,100k,1m")
+    parser.add_argument("--only", help="Run only cases whose name contains this string")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help=f"Maximum timed runs per case (at least {MIN_REPEATS} always run)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown vs. baseline as a fraction (default BENCH_REGRESSION_THRESHOLD or 0.20)")
+    parser.add_argument("--memory-threshold", type=float, help="Allowed peak memory growth (default: --threshold)")
+    parser.add_argument("--json", help="Also write this run's results here")
+    args = parser.parse_args()
+
+    # Rejected questions and bare-mode Streamlit calls both log per call
+    logging.disable(logging.WARNING)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(',') if s.strip()]
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        sys.exit(f"Unknown sizes: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    results = {}
+    print(f"{'case':<42} {'best':>10} {'median':>10} {'peak KiB':>12} {'vs base':>8}")
+    for case in build_cases(sizes):
+        if args.only and args.only not in case.name:
+            continue
+        result = results[case.name] = measure(case, args.repeats)
+        old = baseline.get(case.name, {}).get("time_s")
+        change = f"{result['time_s'] / old - 1:+.0%}" if old else ""
+        print(f"{case.name:<42} {result['time_s']:>9.4f}s {result['median_s']:>9.4f}s "
+              f"{result['peak_kib']:>12.1f} {change:>8}", flush=True)
+
+    report = {
+        "meta": {
+            "recorded": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # Keep baseline entries for cases not run this time
+            with open(args.baseline) as f:
+                report["results"] = dict(json.load(f).get("results", {}), **results)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    memory_threshold = args.memory_threshold if args.memory_threshold is not None else args.threshold
+    regressions = find_regressions(results, baseline, args.threshold, memory_threshold)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:+.0%} time / {memory_threshold:+.0%} memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Local stand-ins for the Pinata API, the Pinata gateway and the SambaNova
+OpenAI-compatible endpoint, for load tests that must not touch the real
+services.
+
+Each service listens on its own port with its own latency distribution and
+error rate. Latency specs:
+
+    const:MS            fixed delay
+    uniform:LO,HI       uniform between LO and HI ms
+    lognormal:MEDIAN,S  lognormal with the given median (ms) and sigma
+    0                   no delay
+
+GET /__stats on any stand-in returns its request and injected-error counts;
+POST /__reset on the Pinata API stand-in ({"pins": N}) regenerates the pin
+history, which the gateway stand-in serves too.
+
+Usage (standalone, to point a manually started app at):
+    python benchmarks/standins.py --pins 500 --llm-latency lognormal:1500,0.4
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+SUBJECTS = ["Mathematics", "Reading", "Science", "English"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+STREAM_CHUNKS = 16
+
+
+class LatencyModel:
+    """Delay distribution parsed from a spec string (see module docstring)."""
+
+    def __init__(self, spec: str = "0"):
+        self.spec = spec
+        kind, _, args = spec.partition(':')
+        values = [float(v) for v in args.split(',') if v]
+        if kind in ('0', ''):
+            self._sample: Callable[[], float] = lambda: 0.0
+        elif kind == 'const':
+            self._sample = lambda: values[0] / 1000
+        elif kind == 'uniform':
+            lo, hi = values[0] / 1000, values[1] / 1000
+            self._sample = lambda: random.uniform(lo, hi)
+        elif kind == 'lognormal':
+            mu, sigma = math.log(values[0] / 1000), values[1]
+            self._sample = lambda: random.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"Unknown latency spec {spec!r}")
+
+    def sample(self) -> float:
+        return self._sample()
+
+
+@dataclass
+class ServiceConfig:
+    """Latency and fault injection for one stand-in."""
+    latency: str = "0"
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (500, 503, 429)
+
+    def __post_init__(self):
+        self.latency_model = LatencyModel(self.latency)
+
+    def fault(self) -> Optional[int]:
+        """Return an HTTP status to fail this request with, or None."""
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_statuses)
+        return None
+
+
+@dataclass
+class PinHistory:
+    """Synthetic pinned answers, newest first, shared by the API and gateway stand-ins."""
+    rows: List[Dict] = field(default_factory=list)
+    content: Dict[str, Dict] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def reset(self, pins: int, seed: int = 0, students: int = 0) -> None:
+        """Replace the history with `pins` answers, spread over student IDs loadtest-1..N if students > 0."""
+        rng = random.Random(seed)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        rows, content = [], {}
+        for i in range(pins):
+            when = start + timedelta(minutes=7 * i)
+            answer = {
+                "timestamp": when.strftime("%Y-%m-%d %H:%M:%S"),
+                "subject": rng.choice(SUBJECTS),
+                "difficulty": rng.choice(DIFFICULTIES),
+                "correct": rng.random() < 0.6,
+            }
+            metadata = None
+            if students:
+                answer["student_id"] = f"loadtest-{i % students + 1}"
+                metadata = {"keyvalues": {"student_id": answer["student_id"]}}
+            cid = self._cid(f"{seed}:{i}")
+            content[cid] = answer
+            rows.append(self._row(cid, when, answer, metadata))
+        rows.reverse()
+        with self.lock:
+            self.rows, self.content = rows, content
+
+    def pin(self, body: Dict) -> Dict:
+        when = datetime.now(timezone.utc)
+        data = body.get('pinataContent', body)
+        cid = self._cid(json.dumps(data, sort_keys=True) + when.isoformat())
+        with self.lock:
+            self.content[cid] = data
+            self.rows.insert(0, self._row(cid, when, data, (body.get('pinataMetadata') or {})))
+        return {"IpfsHash": cid, "PinSize": len(json.dumps(data)), "Timestamp": when.isoformat()}
+
+    @staticmethod
+    def _cid(seed: str) -> str:
+        return "Qm" + hashlib.sha256(seed.encode()).hexdigest()[:44]
+
+    @staticmethod
+    def _row(cid: str, when: datetime, data, metadata: Optional[Dict] = None) -> Dict:
+        return {
+            "ipfs_pin_hash": cid,
+            "date_pinned": when.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "size": len(json.dumps(data)),
+            "metadata": {"name": (metadata or {}).get('name', 'question_response'),
+                         "keyvalues": (metadata or {}).get('keyvalues')},
+        }
+
+    def page(self, params: Dict[str, str]) -> Dict:
+        limit = int(params.get('pageLimit', 10))
+        offset = int(params.get('pageOffset', 0))
+        since, until = params.get('pinStart'), params.get('pinEnd')
+        # Only "eq" conditions, which is all the app sends
+        keyvalues = {key: condition.get('value')
+                     for key, condition in json.loads(params.get('metadata[keyvalues]') or '{}').items()}
+        with self.lock:
+            rows = [r for r in self.rows
+                    if (not since or r['date_pinned'] >= since)
+                    and (not until or r['date_pinned'] <= until)
+                    and all((r['metadata'].get('keyvalues') or {}).get(key) == value
+                            for key, value in keyvalues.items())]
+        return {"count": len(rows), "rows": rows[offset:offset + limit]}
+
+
+def make_question(subject: str, rng: random.Random) -> Dict:
+    correct = rng.choice("ABCD")
+    return {
+        "context": f"A short {subject} passage used as context for the load test question.",
+        "question": f"Which option is correct for this {subject} question?",
+        "options": {letter: f"Option {letter}" for letter in "ABCD"},
+        "correct_option": correct,
+        "explanation": f"Option {correct} is correct.",
+        "category": subject,
+        "difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+    }
+
+
+def completion_text(messages: List[Dict]) -> str:
+    """Return a completion shaped like the model's: a JSON array of questions."""
+    prompt = messages[-1].get('content', '') if messages else ''
+    match = re.search(r"practice question for (\w+)", prompt)
+    subjects = [match.group(1)] if match else SUBJECTS
+    rng = random.Random()
+    questions = [make_question(subject, rng) for subject in subjects]
+    return "Here are your questions:\n" + json.dumps(questions, indent=2)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, handler, name: str, config: ServiceConfig, history: PinHistory):
+        super().__init__(address, handler)
+        self.name = name
+        self.config = config
+        self.history = history
+        self.counts = {"requests": 0, "errors_injected": 0}
+        self.counts_lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self.counts_lock:
+            self.counts[key] += 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "0.1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _admitted(self) -> bool:
+        """Count the request, apply latency and maybe inject a failure."""
+        self.server.count("requests")
+        time.sleep(self.server.config.latency_model.sample())
+        status = self.server.config.fault()
+        if status is None:
+            return True
+        self.server.count("errors_injected")
+        self._send_json(status, {"error": f"injected {status}"})
+        return False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            return self._send_json(200, dict(self.server.counts))
+        if not self._admitted():
+            return
+        history = self.server.history
+        if self.server.name == 'pinata_api' and url.path == '/data/pinList':
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return self._send_json(200, history.page(params))
+        if self.server.name == 'gateway' and url.path.startswith('/ipfs/'):
+            content = history.content.get(url.path[len('/ipfs/'):])
+            if content is None:
+                return self._send_json(404, {"error": "not found"})
+            return self._send_json(200, content)
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self._read_body()
+        if url.path == '/__reset' and self.server.name == 'pinata_api':
+            self.server.history.reset(int(body.get('pins', 0)), int(body.get('seed', 0)),
+                                      int(body.get('students', 0)))
+            return self._send_json(200, {"pins": len(self.server.history.rows)})
+        if not self._admitted():
+            return
+        if self.server.name == 'pinata_api' and url.path == '/pinning/pinJSONToIPFS':
+            return self._send_json(200, self.server.history.pin(body))
+        if self.server.name == 'llm' and url.path.endswith('/chat/completions'):
+            text = completion_text(body.get('messages', []))
+            if body.get('stream'):
+                return self._stream_completion(body, text)
+            return self._send_json(200, {
+                "id": "chatcmpl-loadtest",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get('model', ''),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text) // 4,
+                          "total_tokens": len(text) // 4},
+            })
+        self._send_json(404, {"error": "not found"})
+
+    def _stream_completion(self, body: Dict, text: str) -> None:
+        # Spread a second latency sample across the chunks so streaming takes
+        # about as long as a non-streamed completion after the first token
+        step = max(1, len(text) // STREAM_CHUNKS)
+        pause = self.server.config.latency_model.sample() / STREAM_CHUNKS
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for start in range(0, len(text), step):
+            chunk = {
+                "id": "chatcmpl-loadtest",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get('model', ''),
+                "choices": [{"index": 0, "finish_reason": None,
+                             "delta": {"content": text[start:start + step]}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(pause)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def start_standins(configs: Dict[str, ServiceConfig], pins: int = 0, students: int = 0,
+                   host: str = "127.0.0.1") -> Tuple[Dict[str, str], List[StandInServer]]:
+    """
+    Start the 'pinata_api', 'gateway' and 'llm' stand-ins on free ports.
+
+    Returns the base URL of each (already in the form the app's
+    PINATA_API_URL, PINATA_GATEWAY_URL and SAMBANOVA_BASE_URL expect) and
+    the servers, to shut down when done. With `students`, the pins are
+    spread over student IDs loadtest-1..N.
+    """
+    history = PinHistory()
+    history.reset(pins, students=students)
+    urls, servers = {}, []
+    for name in ('pinata_api', 'gateway', 'llm'):
+        server = StandInServer((host, 0), StandInHandler, name, configs.get(name, ServiceConfig()), history)
+        threading.Thread(target=server.serve_forever, name=f"standin-{name}", daemon=True).start()
+        servers.append(server)
+        base = f"http://{host}:{server.server_address[1]}"
+        urls[name] = base + "/v1" if name == 'llm' else base
+    return urls, servers
+
+
+def add_service_arguments(parser: argparse.ArgumentParser) -> None:
+    """Latency/error options for each stand-in, shared with loadtest.py."""
+    defaults = {'pinata_api': "lognormal:120,0.3", 'gateway': "lognormal:60,0.5", 'llm': "lognormal:1500,0.4"}
+    for name, flag in (('pinata_api', 'pinata'), ('gateway', 'gateway'), ('llm', 'llm')):
+        parser.add_argument(f"--{flag}-latency", default=defaults[name],
+                            help=f"{name} latency spec (default {defaults[name]})")
+        parser.add_argument(f"--{flag}-error-rate", type=float, default=0.0,
+                            help=f"Fraction of {name} requests failed with 500/503/429")
+
+
+def service_configs(args: argparse.Namespace) -> Dict[str, ServiceConfig]:
+    return {
+        'pinata_api': ServiceConfig(args.pinata_latency, args.pinata_error_rate),
+        'gateway': ServiceConfig(args.gateway_latency, args.gateway_error_rate),
+        'llm': ServiceConfig(args.llm_latency, args.llm_error_rate),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_service_arguments(parser)
+    parser.add_argument("--pins", type=int, default=200, help="Synthetic pinned answers to serve")
+    parser.add_argument("--students", type=int, default=0,
+                        help="Spread the pins over student IDs loadtest-1..N (0 = untagged)")
+    args = parser.parse_args()
+
+    urls, servers = start_standins(service_configs(args), args.pins, args.students)
+    print(f"PINATA_API_URL={urls['pinata_api']}")
+    print(f"PINATA_GATEWAY_URL={urls['gateway']}")
+    print(f"SAMBANOVA_BASE_URL={urls['llm']}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
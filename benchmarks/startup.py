@@ -0,0 +1,140 @@
+"""
+Cold-start report for the app and Streamlit entry points.
+
+Each entry point is executed in a fresh interpreter under -X importtime
+(Streamlit pages run in bare mode, as on a first script run). The report
+gives the wall time to execute it, the cumulative import time of each
+module it imports directly, and import self-time summed per top-level
+package, and fails when an entry point exceeds its budget.
+
+Usage:
+    python benchmarks/startup.py                  # table; exit 1 if over budget
+    python benchmarks/startup.py --top 15 --json startup.json
+    python benchmarks/startup.py --budget app=400 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Wall-clock budget per entry point (ms, excluding interpreter start-up)
+STARTUP_BUDGETS_MS = {
+    "app.py": 300,
+    "asgi_app.py": 550,
+    "streamlit_app.py": 550,
+    "test.py": 550,
+    "pages/analytics.py": 550,
+}
+
+# Separates interpreter/probe imports from the entry point's own in the importtime output
+PROBE_MARKER = "--- startup probe ---"
+PROBE = """
+import json, logging, runpy, sys, time
+logging.disable(logging.WARNING)
+sys.stderr.write("%s\\n")
+start = time.perf_counter()
+runpy.run_path(sys.argv[1], run_name="startup_probe")
+print(json.dumps({"wall_ms": (time.perf_counter() - start) * 1000}))
+""" % PROBE_MARKER
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse -X importtime lines into {module, depth, self_us, cumulative_us}."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.lstrip(" ")
+        rows.append({
+            "module": module.strip(),
+            # One leading space, then two per nesting level
+            "depth": (len(name) - len(module) - 1) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return rows
+
+
+def probe(entry: str, workdir: str) -> Dict:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               LOG_LEVEL="WARNING")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, os.path.join(REPO_ROOT, entry)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{entry} failed to start:\n{result.stderr[-2000:]}")
+    wall_ms = json.loads(result.stdout.strip().splitlines()[-1])["wall_ms"]
+    return {"wall_ms": wall_ms, "imports": parse_importtime(result.stderr.split(PROBE_MARKER, 1)[-1])}
+
+
+def report_entry(entry: str, runs: int, top: int, workdir: str) -> Dict:
+    samples = [probe(entry, workdir) for _ in range(runs)]
+    median = sorted(samples, key=lambda s: s["wall_ms"])[len(samples) // 2]
+
+    direct = sorted((row for row in median["imports"] if row["depth"] == 0),
+                    key=lambda row: row["cumulative_us"], reverse=True)
+    packages = defaultdict(int)
+    for row in median["imports"]:
+        packages[row["module"].split(".")[0]] += row["self_us"]
+
+    return {
+        "wall_ms": round(statistics.median(s["wall_ms"] for s in samples), 1),
+        "wall_ms_runs": [round(s["wall_ms"], 1) for s in samples],
+        "import_ms": round(sum(row["cumulative_us"] for row in direct) / 1000, 1),
+        "direct_imports_ms": {row["module"]: round(row["cumulative_us"] / 1000, 1) for row in direct[:top]},
+        "packages_self_ms": {name: round(us / 1000, 1)
+                             for name, us in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entries", nargs="*", default=list(STARTUP_BUDGETS_MS),
+                        help="Entry points relative to the repo root (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per entry point (median reported)")
+    parser.add_argument("--top", type=int, default=8, help="Modules/packages listed per entry point")
+    parser.add_argument("--budget", action="append", default=[], metavar="ENTRY=MS",
+                        help="Override a budget, e.g. app.py=400")
+    parser.add_argument("--json", help="Also write the report here")
+    args = parser.parse_args()
+
+    budgets = dict(STARTUP_BUDGETS_MS)
+    for item in args.budget:
+        name, _, ms = item.partition("=")
+        budgets[name if name.endswith(".py") else name + ".py"] = float(ms)
+
+    report, over = {}, []
+    # Run from an empty directory so no data/ state or .env in the checkout affects timings
+    with tempfile.TemporaryDirectory(prefix="startup-") as workdir:
+        for entry in args.entries:
+            result = report[entry] = report_entry(entry, args.runs, args.top, workdir)
+            budget = budgets.get(entry)
+            result["budget_ms"] = budget
+            status = "" if budget is None else ("OVER BUDGET" if result["wall_ms"] > budget else "ok")
+            if status == "OVER BUDGET":
+                over.append(entry)
+            print(f"{entry}: {result['wall_ms']} ms (budget {budget} ms) {status}")
+            print(f"  imports: {result['import_ms']} ms total")
+            for module, ms in result["direct_imports_ms"].items():
+                print(f"    {module:<36} {ms:>8.1f} ms")
+            print("  self time by package: " + ", ".join(f"{name} {ms}" for name, ms
+                                                         in result["packages_self_ms"].items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if over:
+        sys.exit(f"Over start-up budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# IPFS content is immutable, so entries never need invalidation - only eviction
+DEFAULT_CACHE_PATH = os.getenv("CID_CACHE_PATH", os.path.join("data", "cid_cache.sqlite3"))
+DEFAULT_MAX_BYTES = int(os.getenv("CID_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Hits update LRU order in memory; it is written back on the next put or after this long
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+class CIDCache:
+    """
+    Persistent, content-addressed cache of parsed gateway reads.
+
+    Entries are keyed by CID and stored as JSON in a SQLite file. When the
+    total stored size exceeds max_bytes the least recently used entries are
+    evicted. Safe to share between threads, and between processes (the
+    file is in WAL mode; each worker opens its own connection). A hit is a
+    read only: access times are batched and written back later.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._touches_flushed_at = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cid_cache ("
+            " cid TEXT PRIMARY KEY,"
+            " body TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cid_cache_lru ON cid_cache (last_access)")
+        # Total stored bytes, kept current by triggers so every process sees the same figure
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cid_cache_bytes (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO cid_cache_bytes VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM cid_cache));"
+            "CREATE TRIGGER IF NOT EXISTS cid_cache_insert AFTER INSERT ON cid_cache"
+            " BEGIN UPDATE cid_cache_bytes SET total = total + NEW.size; END;"
+            "CREATE TRIGGER IF NOT EXISTS cid_cache_update AFTER UPDATE OF size ON cid_cache"
+            " BEGIN UPDATE cid_cache_bytes SET total = total + NEW.size - OLD.size; END;"
+            "CREATE TRIGGER IF NOT EXISTS cid_cache_delete AFTER DELETE ON cid_cache"
+            " BEGIN UPDATE cid_cache_bytes SET total = total - OLD.size; END;"
+        )
+        self._conn.commit()
+
+    def get(self, cid: str) -> Optional[Any]:
+        """Return the cached content for a CID, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM cid_cache WHERE cid = ?", (cid,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[cid] = time.time()
+            if time.monotonic() - self._touches_flushed_at >= TOUCH_FLUSH_SECONDS:
+                self._flush_touches()
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, cid: str, content: Any) -> None:
+        """Store content for a CID, evicting least recently used entries if over the cap."""
+        body = json.dumps(content)
+        size = len(body.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # Eviction below should see current LRU order
+            self._flush_touches()
+            # An upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the size triggers
+            self._conn.execute(
+                "INSERT INTO cid_cache (cid, body, size, last_access) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (cid) DO UPDATE SET body = excluded.body, size = excluded.size,"
+                " last_access = excluded.last_access",
+                (cid, body, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        # Caller holds the lock and commits
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE cid_cache SET last_access = ? WHERE cid = ?",
+                [(last_access, cid) for cid, last_access in self._touched.items()]
+            )
+            self._touched.clear()
+        self._touches_flushed_at = time.monotonic()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT total FROM cid_cache_bytes WHERE id = 0").fetchone()[0]
+
+    def _evict(self) -> None:
+        # Caller holds the lock, inside the put's transaction
+        while self._total_bytes() > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT cid FROM cid_cache ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM cid_cache WHERE cid = ?", (row[0],))
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current cache occupancy."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cid_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cid_cache() -> CIDCache:
+    """Return the process-wide CID cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CIDCache()
+    return _cache
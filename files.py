@@ -2,6 +2,8 @@ import os
 import requests
 from dotenv import load_dotenv
 
+from http_client import get_http_client
+
 # Load environment variables
 load_dotenv()
 
@@ -25,7 +27,7 @@ def upload_question(question_data):
     payload = "test"
 
     try:
-        response = requests.post(f'{URL}/files', headers=HEADERS, data=payload)
+        response = get_http_client().post(f'{URL}/files', headers=HEADERS, data=payload)
         response.raise_for_status()  # Raise HTTPError for bad responses
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,280 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+DEFAULT_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "512"))
+DEFAULT_MAX_VARIANTS = int(os.getenv("GENERATION_CACHE_MAX_VARIANTS", "4"))
+SCORE_BUCKET_SIZE = int(os.getenv("GENERATION_CACHE_BUCKET_SIZE", "3"))
+# Set (gunicorn.conf.py does) to share cached sets between worker processes via SQLite
+SHARED_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH")
+
+
+def profile_key(user_results: Dict, regional_results: Dict, prompt_version: str,
+                bucket_size: int = SCORE_BUCKET_SIZE) -> Tuple:
+    """
+    Normalize a score profile into a cache key.
+
+    Scores are bucketed per subject so near-identical profiles share entries,
+    and the prompt version keeps sets from different prompts apart.
+    """
+    def buckets(results: Dict) -> Tuple:
+        return tuple(sorted(
+            (str(subject), int(float(score)) // bucket_size)
+            for subject, score in (results or {}).items()
+        ))
+
+    return prompt_version, buckets(user_results), buckets(regional_results)
+
+
+class GenerationCache:
+    """
+    LRU cache of generated question sets keyed by normalized score profile.
+
+    Each profile holds up to max_variants question sets. A viewer (student
+    or session ID) is only served variants they have not seen yet; once they
+    have seen all of them, get() misses so a fresh set is generated and added,
+    replacing the oldest variant if the entry is full.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_variants: int = DEFAULT_MAX_VARIANTS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._next_variant_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, viewer: Optional[str] = None) -> Optional[List[Dict]]:
+        """Return a cached question set this viewer has not seen, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._expire(entry)
+                if not entry['variants']:
+                    del self._entries[key]
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            seen = entry['seen'].setdefault(viewer, set()) if viewer is not None else set()
+            unseen = [v for v in entry['variants'] if v['id'] not in seen]
+            if not unseen:
+                self.misses += 1
+                return None
+
+            variant = random.choice(unseen)
+            if viewer is not None:
+                seen.add(variant['id'])
+            self.hits += 1
+            return variant['questions']
+
+    def put(self, key: Hashable, questions: List[Dict], viewer: Optional[str] = None) -> int:
+        """Add a freshly generated set for a profile, marking it seen by the viewer. Returns its variant ID."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {'variants': [], 'seen': {}}
+            self._entries.move_to_end(key)
+
+            variant = {'id': self._next_variant_id, 'questions': questions, 'created_at': time.time()}
+            self._next_variant_id += 1
+            entry['variants'].append(variant)
+            if len(entry['variants']) > self.max_variants:
+                entry['variants'].pop(0)
+            if viewer is not None:
+                entry['seen'].setdefault(viewer, set()).add(variant['id'])
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return variant['id']
+
+    def mark_seen(self, key: Hashable, variant_id: int, viewer: Optional[str]) -> None:
+        """Record that a viewer was served a variant, e.g. one generated for a coalesced request."""
+        if viewer is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['seen'].setdefault(viewer, set()).add(variant_id)
+
+    def _expire(self, entry: Dict) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        entry['variants'] = [v for v in entry['variants'] if v['created_at'] >= cutoff]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "variants": sum(len(e['variants']) for e in self._entries.values()),
+            }
+
+
+class SharedGenerationCache:
+    """
+    GenerationCache semantics backed by a SQLite file in WAL mode, so that
+    pre-forked workers serve each other's sets and share per-viewer
+    seen-tracking. Lookups are plain reads; only put() and serving a
+    variant to a viewer open a (short) write transaction.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_variants: int = DEFAULT_MAX_VARIANTS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, last_access REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);"
+            "CREATE TABLE IF NOT EXISTS variants ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL,"
+            " questions TEXT NOT NULL,"
+            " created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS variants_key ON variants (key);"
+            "CREATE TABLE IF NOT EXISTS seen (viewer TEXT NOT NULL, variant_id INTEGER NOT NULL,"
+            " PRIMARY KEY (viewer, variant_id));"
+        )
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return json.dumps(key, separators=(',', ':'))
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def get(self, key: Hashable, viewer: Optional[str] = None) -> Optional[List[Dict]]:
+        """Return a cached question set this viewer has not seen, or None."""
+        key = self._key(key)
+        with self._lock:
+            # A plain read: misses take no write lock, and expired variants are purged by put()
+            rows = self._conn.execute(
+                "SELECT id, questions FROM variants WHERE key = ? AND created_at >= ? AND id NOT IN"
+                " (SELECT variant_id FROM seen WHERE viewer = ?)",
+                (key, time.time() - self.ttl_seconds, viewer if viewer is not None else '')
+            ).fetchall()
+            if not rows:
+                self.misses += 1
+                return None
+            self.hits += 1
+        variant_id, questions = random.choice(rows)
+        if viewer is not None:
+            # The only write on the read path: recording what was served
+            def serve(conn: sqlite3.Connection) -> None:
+                conn.execute("INSERT OR IGNORE INTO seen (viewer, variant_id) VALUES (?, ?)", (viewer, variant_id))
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+
+            self._transaction(serve)
+        return json.loads(questions)
+
+    def put(self, key: Hashable, questions: List[Dict], viewer: Optional[str] = None) -> int:
+        """Add a freshly generated set for a profile, marking it seen by the viewer. Returns its variant ID."""
+        key = self._key(key)
+        body = json.dumps(questions)
+
+        def store(conn: sqlite3.Connection) -> int:
+            now = time.time()
+            # Expired sets of every profile go here, keeping lookups read-only
+            conn.execute("DELETE FROM variants WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("INSERT OR REPLACE INTO entries (key, last_access) VALUES (?, ?)", (key, now))
+            variant_id = conn.execute("INSERT INTO variants (key, questions, created_at) VALUES (?, ?, ?)",
+                                      (key, body, now)).lastrowid
+            if viewer is not None:
+                conn.execute("INSERT OR IGNORE INTO seen (viewer, variant_id) VALUES (?, ?)", (viewer, variant_id))
+            conn.execute(
+                "DELETE FROM variants WHERE key = ? AND id NOT IN"
+                " (SELECT id FROM variants WHERE key = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, self.max_variants)
+            )
+            for (evicted,) in conn.execute(
+                "SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+            ).fetchall():
+                conn.execute("DELETE FROM entries WHERE key = ?", (evicted,))
+                conn.execute("DELETE FROM variants WHERE key = ?", (evicted,))
+            # Seen-marks only matter while their variant exists
+            conn.execute("DELETE FROM seen WHERE variant_id NOT IN (SELECT id FROM variants)")
+            return variant_id
+
+        return self._transaction(store)
+
+    def mark_seen(self, key: Hashable, variant_id: int, viewer: Optional[str]) -> None:
+        """Record that a viewer was served a variant, e.g. one generated for a coalesced request."""
+        if viewer is None:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO seen (viewer, variant_id) VALUES (?, ?)", (viewer, variant_id))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            variants = self._conn.execute("SELECT COUNT(*) FROM variants").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                # Hits and misses are this worker's; entries and variants are shared
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "variants": variants,
+                "pid": os.getpid(),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> Union[GenerationCache, SharedGenerationCache]:
+    """
+    Return the process-wide generation cache, creating it on first use:
+    SQLite-backed when GENERATION_CACHE_PATH is set, in memory otherwise.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SharedGenerationCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else GenerationCache()
+    return _cache
+
+
+def is_cacheable(questions: Optional[List[Dict]]) -> bool:
+    """Only successful, non-empty generations are worth caching."""
+    return bool(questions) and not any(q.get('category') == 'Error' for q in questions)
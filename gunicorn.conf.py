@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for serving app.py with pre-forked workers:
+
+    gunicorn app:app
+
+Workers default to one per core (WEB_CONCURRENCY overrides), each running
+GUNICORN_THREADS threads since requests mostly wait on Pinata and the LLM.
+Workers share cached CID content, generated question sets and the pin
+index through SQLite files (WAL mode) under data/, and /metrics merges the
+per-worker files written to METRICS_MULTIPROC_DIR.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Generation can take tens of seconds (FANOUT_DEADLINE, LLM retries)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Each worker imports the app itself, so clients, pools, SQLite connections
+# and logging threads are never inherited across fork
+preload_app = False
+
+# Read by the workers' metrics and generation_cache modules
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join("data", "metrics"))
+os.environ.setdefault("GENERATION_CACHE_PATH", os.path.join("data", "generation_cache.sqlite3"))
+
+
+def on_starting(server):
+    # Totals from a previous server run must not be added to this one
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def worker_exit(server, worker):
+    # Keep a stopped worker's final counts in the merged totals
+    from metrics import registry
+    registry.write_snapshot()
@@ -0,0 +1,93 @@
+import logging
+import math
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from subjects import SUBJECT_MAP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "300"))
+DEFAULT_MAX_RECENT = int(os.getenv("HISTORY_MAX_RECENT", "8"))
+DIFFICULTY_ORDER = ['easy', 'medium', 'hard']
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Llama-style tokenizers)."""
+    return math.ceil(len(text) / 4)
+
+
+def _subject(answer: Dict) -> str:
+    subject = answer.get('subject') or answer.get('category') or 'Unknown'
+    return SUBJECT_MAP.get(subject, subject)
+
+
+def _aggregate_lines(answers: List[Dict]) -> List[str]:
+    # subject -> difficulty -> [answered, correct]
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for answer in answers:
+        bucket = totals[_subject(answer)][str(answer.get('difficulty', 'medium')).lower()]
+        bucket[0] += 1
+        bucket[1] += 1 if answer.get('correct') is True else 0
+
+    lines = []
+    for subject in sorted(totals):
+        by_difficulty = totals[subject]
+        answered = sum(b[0] for b in by_difficulty.values())
+        correct = sum(b[1] for b in by_difficulty.values())
+        ordered = sorted(by_difficulty, key=lambda d: (DIFFICULTY_ORDER.index(d) if d in DIFFICULTY_ORDER else 99, d))
+        detail = ", ".join(f"{d} {by_difficulty[d][1]}/{by_difficulty[d][0]}" for d in ordered)
+        lines.append(f"{subject}: {correct}/{answered} correct ({detail})")
+    return lines
+
+
+def _recent_item(answer: Dict) -> str:
+    mark = "correct" if answer.get('correct') is True else "wrong"
+    return f"{_subject(answer)}/{str(answer.get('difficulty', 'medium')).lower()} {mark}"
+
+
+def summarize_history(answers: List[Dict], token_budget: Optional[int] = None,
+                      max_recent: int = DEFAULT_MAX_RECENT) -> str:
+    """
+    Compress answered questions into a prompt-sized summary.
+
+    The summary has per-subject/difficulty accuracy aggregates followed by
+    the most recent answers. Recent items are dropped first, then aggregate
+    lines, until the text fits token_budget. Token counts before and after
+    compression are logged.
+
+    Args:
+        answers: Answer records (subject, difficulty, correct, timestamp)
+        token_budget: Maximum estimated tokens (defaults to HISTORY_TOKEN_BUDGET)
+        max_recent: Most recent answers to list individually
+
+    Returns:
+        str: The summary text
+    """
+    budget = token_budget if token_budget is not None else DEFAULT_TOKEN_BUDGET
+    if not answers:
+        return "No questions answered yet."
+
+    header = f"{len(answers)} questions answered."
+    aggregates = _aggregate_lines(answers)
+    recent = sorted(answers, key=lambda a: str(a.get('timestamp', '')), reverse=True)[:max_recent]
+    recent_items = [_recent_item(a) for a in recent]
+
+    def render(agg: List[str], items: List[str]) -> str:
+        parts = [header] + agg
+        if items:
+            parts.append("Most recent first: " + "; ".join(items))
+        return "\n".join(parts)
+
+    summary = render(aggregates, recent_items)
+    while estimate_tokens(summary) > budget and recent_items:
+        recent_items.pop()
+        summary = render(aggregates, recent_items)
+    while estimate_tokens(summary) > budget and aggregates:
+        aggregates.pop()
+        summary = render(aggregates, recent_items)
+
+    logger.info("History summary: %d answers -> %d tokens summarized (budget %d)",
+                len(answers), estimate_tokens(summary), budget)
+    return summary
@@ -0,0 +1,204 @@
+"""
+Shared keep-alive HTTP client for Pinata API and gateway traffic.
+
+One requests.Session per host, each with a connection pool sized for that
+host, explicit connect/read timeouts, and retries with full-jitter
+exponential backoff on 429 and 5xx. Non-idempotent requests (POST) are only
+retried on 429, when the server has rejected them without acting on them.
+
+requests itself is imported when the first session is created, so
+importing this module (e.g. for its URL settings) stays cheap. The async
+server's httpx client gets the same retry policy from async_request().
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Overridable so a deployment (or benchmarks/loadtest.py) can point at another endpoint
+PINATA_API_URL = os.getenv("PINATA_API_URL", "https://api.pinata.cloud").rstrip('/')
+PINATA_GATEWAY_URL = os.getenv("PINATA_GATEWAY_URL", "https://gateway.pinata.cloud").rstrip('/')
+PINATA_API_HOST = urlsplit(PINATA_API_URL).netloc
+PINATA_GATEWAY_HOST = urlsplit(PINATA_GATEWAY_URL).netloc
+
+# Connections kept alive per host; the gateway sees parallel CID fetches
+POOL_SIZES = {
+    PINATA_API_HOST: int(os.getenv("HTTP_POOL_SIZE_PINATA_API", "8")),
+    PINATA_GATEWAY_HOST: int(os.getenv("HTTP_POOL_SIZE_GATEWAY", "32")),
+}
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE_DEFAULT", "4"))
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class PooledHTTPClient:
+    """Per-host pooled sessions with timeouts and jittered retries."""
+
+    def __init__(self, timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries: int = MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._sessions: Dict[str, "requests.Session"] = {}
+        self._adapters: Dict[str, "HTTPAdapter"] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, host: str) -> "requests.Session":
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if host not in self._sessions:
+                size = POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=False)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._adapters[host] = adapter
+                self._counters[host] = {"requests": 0, "retries": 0, "errors": 0,
+                                        "in_flight": 0, "peak_in_flight": 0}
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def _count(self, host: str, key: str, n: int = 1) -> None:
+        with self._lock:
+            counters = self._counters[host]
+            counters[key] += n
+            if key == "in_flight":
+                counters["peak_in_flight"] = max(counters["peak_in_flight"], counters["in_flight"])
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """
+        Send a request through the host's pool, retrying transient failures.
+
+        Accepts the same keyword arguments as requests.request; timeout
+        defaults to (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT). The final
+        response is returned even if its status is an error, as requests
+        would; connection errors are raised after the last attempt.
+        """
+        import requests
+        method = method.upper()
+        host = urlsplit(url).netloc
+        session = self._session(host)
+        kwargs.setdefault('timeout', self.timeout)
+        idempotent = method in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            self._count(host, "requests")
+            # Each request in flight holds one of the host's pooled connections
+            self._count(host, "in_flight")
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count(host, "errors")
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("%s %s failed (%s); retrying in %.2fs", method, host, e, delay)
+            else:
+                retryable = response.status_code in RETRY_STATUSES and (idempotent or response.status_code == 429)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response) or self._backoff(attempt)
+                logger.warning("%s %s returned %d; retrying in %.2fs", method, host, response.status_code, delay)
+                response.close()
+            finally:
+                self._count(host, "in_flight", -1)
+
+            self._count(host, "retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        return self.request('POST', url, **kwargs)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # Full jitter: spreads retries from many clients instead of synchronising them
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response: "requests.Response") -> Optional[float]:
+        value = response.headers.get('Retry-After')
+        try:
+            return min(BACKOFF_MAX, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    def stats(self) -> Dict[str, Dict]:
+        """Request/retry/error counts and connection usage (requests in flight, peak) per host."""
+        with self._lock:
+            return {
+                host: dict(counters, pool_size=POOL_SIZES.get(host, DEFAULT_POOL_SIZE))
+                for host, counters in self._counters.items()
+            }
+
+
+async def async_request(client: "httpx.AsyncClient", method: str, url: str,
+                        max_retries: int = MAX_RETRIES, **kwargs) -> "httpx.Response":
+    """
+    httpx counterpart of PooledHTTPClient.request: the same retry policy
+    (429/5xx and connection errors, full-jitter backoff, Retry-After,
+    non-idempotent methods only retried on 429) for an async client.
+    """
+    import asyncio
+    import httpx
+    method = method.upper()
+    host = urlsplit(url).netloc
+    idempotent = method in IDEMPOTENT_METHODS
+
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:  # includes timeouts
+            if not idempotent or attempt >= max_retries:
+                raise
+            delay = PooledHTTPClient._backoff(attempt)
+            logger.warning("%s %s failed (%s); retrying in %.2fs", method, host, e, delay)
+        else:
+            retryable = response.status_code in RETRY_STATUSES and (idempotent or response.status_code == 429)
+            if not retryable or attempt >= max_retries:
+                return response
+            delay = PooledHTTPClient._retry_after(response) or PooledHTTPClient._backoff(attempt)
+            logger.warning("%s %s returned %d; retrying in %.2fs", method, host, response.status_code, delay)
+            await response.aclose()
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+_client: Optional[PooledHTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Return the process-wide pooled client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PooledHTTPClient()
+        return _client
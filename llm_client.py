@@ -0,0 +1,39 @@
+"""
+Lazily constructed SambaNova (OpenAI-compatible) clients.
+
+The openai package takes longer to import than the rest of the app put
+together, so it is only imported when the first completion is requested.
+Settings are read at that point too, after the entry point's load_dotenv().
+LLM_TIMEOUT caps each request (the openai default is 10 minutes); fan-out
+calls pass a shorter, per-call timeout.
+"""
+import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def llm_settings() -> dict:
+    return {
+        "api_key": os.getenv("SAMBANOVA_API_KEY", "cf134cde-f4d2-4e6d-90b4-500e269eb286"),
+        "base_url": os.getenv("SAMBANOVA_BASE_URL", "https://api.sambanova.ai/v1"),
+        "timeout": float(os.getenv("LLM_TIMEOUT", "60")),
+    }
+
+
+def get_llm_client():
+    """Return the process-wide openai.OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+                _client = openai.OpenAI(**llm_settings())
+    return _client
+
+
+def new_async_llm_client():
+    """Create an openai.AsyncOpenAI client; call from the event loop that will use it."""
+    import openai
+    return openai.AsyncOpenAI(**llm_settings())
@@ -0,0 +1,358 @@
+import json
+import re
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+STRUCTURAL = re.compile(r'["{}\[\]/]')
+STRING_SPECIAL = re.compile(r'["\\]')
+NON_SPACE = re.compile(r'\S')
+ARRAY_START = re.compile(r'\[\s*[{\]]')
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the JSON faults LLMs commonly produce, in one pass.
+
+    Handles trailing commas, // and /* */ comments, single-quoted strings,
+    raw newlines/tabs inside strings and Python True/False/None. Valid JSON
+    comes back unchanged.
+    """
+    out = []
+    i, n = 0, len(text)
+    quote = None  # delimiter of the string being copied, if any
+    while i < n:
+        char = text[i]
+        if quote is not None:
+            if char == '\\' and i + 1 < n:
+                # \' is not a JSON escape; the apostrophe needs none
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                i += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')  # only reachable inside a single-quoted string
+            elif char == '\n':
+                out.append('\\n')
+            elif char == '\r':
+                out.append('\\r')
+            elif char == '\t':
+                out.append('\\t')
+            else:
+                out.append(char)
+            i += 1
+            continue
+
+        if char in '"\'':
+            quote = char
+            out.append('"')
+        elif char == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif char == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif char == ',':
+            # Drop the comma if the next significant character closes a container
+            j = i + 1
+            while j < n and text[j] in ' \t\r\n':
+                j += 1
+            if j < n and text[j] in '}]':
+                i += 1
+                continue
+            out.append(char)
+        elif char.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            out.append(PYTHON_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return ''.join(out)
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array of objects arriving in chunks.
+
+    Text before the array (prose, ```json fences, arrays without objects
+    such as "[]") is skipped, as are // and /* */ comments around objects. Each top-level object is decoded as soon as
+    its closing brace arrives, so callers can act on the first question long
+    before the completion finishes.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self._array_objects = 0
+        self.done = False
+        self.repaired = 0
+        self.dropped = 0
+
+    @property
+    def in_array(self) -> bool:
+        """Whether the parser is inside the question array."""
+        return self._in_array
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a chunk of text and return the objects it completed."""
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            if not self._in_array:
+                if not self._seek_array():
+                    break
+                continue
+
+            if self._escaped:
+                self._escaped = False
+                self._pos += 1
+                continue
+
+            # Jump straight to the next character that can change parser state
+            match = (STRING_SPECIAL if self._in_string else STRUCTURAL).search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                break
+            self._pos = match.start()
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if char == '\\':
+                    self._escaped = True
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '/':
+                end = self._skip_comment(self._pos)
+                if end is None:
+                    break  # need more input to see the whole comment
+                self._pos = end
+                continue
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._object_start = self._pos
+                self._depth += 1
+            else:
+                if self._depth == 0 and char == ']':
+                    self._pos += 1
+                    if self._array_objects == 0:
+                        # An empty array in the prose; the questions come later
+                        self._in_array = False
+                        continue
+                    self.done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    self._array_objects += 1
+                    obj = self._decode(buffer[self._object_start:self._pos + 1])
+                    if obj is not None:
+                        completed.append(obj)
+                    self._object_start = None
+            self._pos += 1
+
+        self._compact()
+        return completed
+
+    def _seek_array(self) -> bool:
+        # The array starts at a '[' whose next character, past spaces and
+        # comments, is '{' (or ']' for an empty array)
+        while True:
+            start = self._buffer.find('[', self._pos)
+            if start == -1:
+                self._pos = len(self._buffer)
+                return False
+            nxt = self._next_significant(start + 1)
+            if nxt is None:
+                # Need more input to decide
+                self._pos = start
+                return False
+            if self._buffer[nxt] in '{]':
+                self._in_array = True
+                self._pos = nxt
+                return True
+            self._pos = start + 1
+
+    def _next_significant(self, pos: int) -> Optional[int]:
+        """Index of the first character from pos that is not space or comment; None if more input is needed."""
+        while True:
+            match = NON_SPACE.search(self._buffer, pos)
+            if match is None:
+                return None
+            pos = match.start()
+            if self._buffer[pos] != '/':
+                return pos
+            end = self._skip_comment(pos)
+            if end is None:
+                return None
+            if end == pos + 1:
+                return pos  # a lone '/', not a comment
+            pos = end
+
+    def _skip_comment(self, pos: int) -> Optional[int]:
+        """Index just past the comment starting at pos (pos + 1 if '/' starts none); None if it is incomplete."""
+        buffer = self._buffer
+        if pos + 1 >= len(buffer):
+            return None
+        if buffer[pos + 1] == '/':
+            end = buffer.find('\n', pos + 2)
+            return None if end == -1 else end + 1
+        if buffer[pos + 1] == '*':
+            end = buffer.find('*/', pos + 2)
+            return None if end == -1 else end + 2
+        return pos + 1
+
+    def _compact(self) -> None:
+        # Drop consumed text, keeping any partially received object
+        keep_from = self._object_start if self._object_start is not None else self._pos
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._object_start is not None:
+                self._object_start -= keep_from
+
+    def _decode(self, text: str) -> Optional[Dict]:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                obj = json.loads(repair_json(text))
+                self.repaired += 1
+            except json.JSONDecodeError:
+                self.dropped += 1
+                return None
+        return obj if isinstance(obj, dict) else None
+
+
+def extract_json_objects(text: str) -> List[Dict]:
+    """
+    Recover every complete object of the JSON array in an LLM completion.
+
+    The array may sit anywhere in the text (prose, ```json fences), may be
+    truncated mid-object (e.g. by max_tokens) and may contain the faults
+    handled by repair_json. A bare object or object sequence with no
+    enclosing array is accepted too.
+    """
+    # Fast path: a well-formed array decodes in one C-level call. Arrays with
+    # no objects (e.g. a "[]" in the prose before the questions) are skipped.
+    decoder = json.JSONDecoder()
+    for match in ARRAY_START.finditer(text):
+        try:
+            array, _ = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        objects = [obj for obj in array if isinstance(obj, dict)]
+        if objects:
+            return objects
+
+    parser = JSONArrayStreamParser()
+    objects = parser.feed(text)
+    if objects or parser.in_array:
+        return objects
+
+    start = text.find('{')
+    if start == -1:
+        return []
+    parser = JSONArrayStreamParser()
+    return parser.feed('[' + text[start:])
+
+
+def recover_objects(text: str,
+                    validator: Optional[Callable[[Dict], bool]] = None,
+                    fallback: Optional[Callable[[str], List[Dict]]] = None) -> List[Dict]:
+    """
+    Objects for a completed stream that yielded none: extract_json_objects
+    over the whole text, then `fallback` (e.g. an unstructured-text parser)
+    if that finds no valid object either.
+    """
+    objects = [obj for obj in extract_json_objects(text) if validator is None or validator(obj)]
+    if not objects and fallback is not None:
+        return fallback(text)
+    return objects
+
+
+def iter_array_objects(chunks: Iterable[str],
+                       validator: Optional[Callable[[Dict], bool]] = None,
+                       fallback: Optional[Callable[[str], List[Dict]]] = None) -> Iterator[Dict]:
+    """
+    Yield each object of a streamed JSON array as soon as it is complete.
+
+    If the stream ends without a valid object, the buffered text goes
+    through the non-streaming recovery (see recover_objects).
+
+    Args:
+        chunks: Text fragments, e.g. streamed completion deltas
+        validator: Optional predicate; objects failing it are dropped
+        fallback: Optional last-resort parser for the whole text
+    """
+    parser = JSONArrayStreamParser()
+    received = []
+    for chunk in chunks:
+        if received is not None:
+            received.append(chunk)
+        for obj in parser.feed(chunk):
+            if validator is None or validator(obj):
+                received = None  # something was yielded; no recovery needed
+                yield obj
+        if parser.done and received is None:
+            return
+    if received is not None:
+        yield from recover_objects(''.join(received), validator, fallback)
+
+
+def completion_deltas(stream) -> Iterator[str]:
+    """Extract text deltas from an OpenAI-compatible streaming completion."""
+    for event in stream:
+        if not event.choices:
+            continue
+        content = event.choices[0].delta.content
+        if content:
+            yield content
+
+
+async def aiter_array_objects(chunks: AsyncIterable[str],
+                              validator: Optional[Callable[[Dict], bool]] = None,
+                              fallback: Optional[Callable[[str], List[Dict]]] = None) -> AsyncIterator[Dict]:
+    """Async counterpart of iter_array_objects."""
+    parser = JSONArrayStreamParser()
+    received = []
+    async for chunk in chunks:
+        if received is not None:
+            received.append(chunk)
+        for obj in parser.feed(chunk):
+            if validator is None or validator(obj):
+                received = None
+                yield obj
+        if parser.done and received is None:
+            return
+    if received is not None:
+        for obj in recover_objects(''.join(received), validator, fallback):
+            yield obj
+
+
+async def acompletion_deltas(stream) -> AsyncIterator[str]:
+    """Async counterpart of completion_deltas."""
+    async for event in stream:
+        if not event.choices:
+            continue
+        content = event.choices[0].delta.content
+        if content:
+            yield content
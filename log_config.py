@@ -0,0 +1,151 @@
+"""
+Non-blocking structured logging for the API servers.
+
+configure_logging() puts a single queue handler on the root logger. Request
+threads only enqueue records; a background QueueListener thread formats
+them (as JSON lines by default) and writes them to stderr, so a slow
+terminal or log collector never adds latency to a request.
+
+Records are only rendered (JSON encoding, timestamps) on the listener
+thread. The %-style message and any traceback are resolved when the record
+is enqueued, as the stdlib QueueHandler does, so objects mutated after the
+call are logged as they were and no stack frames are kept alive. Log with
+%-style arguments rather than f-strings (filtered-out levels then cost
+nothing), and wrap large bodies (prompts, completions, question sets) in
+payload() to have them truncated.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "2000"))
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+
+
+def truncate(text: str, limit: int = LOG_MAX_PAYLOAD_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[+{len(text) - limit} chars]"
+
+
+class Payload:
+    """A value rendered (as JSON where possible) and truncated only when a record is actually emitted."""
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = LOG_MAX_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            text = self.value
+        else:
+            try:
+                text = json.dumps(self.value, default=str, ensure_ascii=False)
+            except (TypeError, ValueError):
+                text = repr(self.value)
+        return truncate(text, self.limit)
+
+    __repr__ = __str__
+
+
+def payload(value: Any, limit: int = LOG_MAX_PAYLOAD_CHARS) -> Payload:
+    """Wrap a large log argument so it is only formatted if the level is enabled."""
+    return Payload(value, limit)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, any extra= fields and the traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_exception_formatter = logging.Formatter()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves rendering to the listener thread and drops
+    records instead of blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and exc_info now (the caller may mutate what it logged, and a
+        # traceback pins its frames), but unlike the stock prepare() skip the formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    Route all logging through a background writer thread. Safe to call more
+    than once; only the first call installs the handlers.
+
+    Args:
+        level: Root log level name (LOG_LEVEL, default INFO)
+        fmt: "json" for structured records, anything else for plain text (LOG_FORMAT)
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if fmt == 'json':
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on interpreter exit
+    atexit.register(_listener.stop)
@@ -0,0 +1,378 @@
+"""
+In-process metrics: sharded counters and log-bucketed latency histograms.
+
+Recording never logs and never takes a shared lock: each metric is split
+into SHARDS slots, each thread being assigned one round-robin on its first
+recording, each slot with its own (almost always uncontended) lock. Readers merge the shards. Histograms split every power
+of two between ~60ns and ~17min into 8 linear buckets, so reported
+percentiles are within ~6% of the true value.
+
+With METRICS_MULTIPROC_DIR set (as gunicorn.conf.py does), each process
+also writes its raw metrics to <dir>/metrics-<pid>.json every
+METRICS_FLUSH_SECONDS, and readers merge every process's file, so
+/metrics reports totals across pre-forked workers.
+"""
+import atexit
+import functools
+import glob
+import inspect
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SHARDS = 16
+BUCKETS_PER_OCTAVE = 8
+MIN_EXPONENT = -23  # frexp exponent of the smallest bucket (2**-24 s, ~60ns)
+NUM_BUCKETS = BUCKETS_PER_OCTAVE * 34
+QUANTILES = {0.5: 'p50', 0.9: 'p90', 0.99: 'p99', 0.999: 'p999'}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_frexp = math.frexp
+_thread_shard = threading.local()
+_shard_sequence = itertools.count()
+
+
+def _assign_shard() -> int:
+    """Give the calling thread the next shard, round-robin."""
+    # Not ident % SHARDS: thread idents are aligned stack addresses, so they
+    # would all land in shard 0
+    _thread_shard.index = index = next(_shard_sequence) % SHARDS
+    return index
+
+
+def bucket_index(value: float) -> int:
+    mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+    index = (exponent - MIN_EXPONENT) * BUCKETS_PER_OCTAVE + int((mantissa - 0.5) * 2 * BUCKETS_PER_OCTAVE)
+    return 0 if index < 0 else min(index, NUM_BUCKETS - 1)
+
+
+def bucket_value(index: int) -> float:
+    """Midpoint of a bucket, used as its representative value."""
+    octave, sub = divmod(index, BUCKETS_PER_OCTAVE)
+    return (0.5 + (sub + 0.5) / (2 * BUCKETS_PER_OCTAVE)) * 2.0 ** (octave + MIN_EXPONENT)
+
+
+class _CounterShard:
+    __slots__ = ('lock', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+
+class Counter:
+    """Monotonic counter sharded by thread."""
+
+    def __init__(self):
+        self._shards = [_CounterShard() for _ in range(SHARDS)]
+
+    def inc(self, amount: float = 1.0) -> None:
+        try:
+            shard = self._shards[_thread_shard.index]
+        except AttributeError:
+            shard = self._shards[_assign_shard()]
+        with shard.lock:
+            shard.value += amount
+
+    @property
+    def value(self) -> float:
+        return sum(shard.value for shard in self._shards)
+
+
+class _HistogramShard:
+    __slots__ = ('lock', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+
+class Histogram:
+    """Log-bucketed histogram of non-negative values (latencies in seconds)."""
+
+    def __init__(self):
+        self._shards = [_HistogramShard() for _ in range(SHARDS)]
+
+    def observe(self, value: float) -> None:
+        # bucket_index, inlined: this runs on every timed call
+        mantissa, exponent = _frexp(value)
+        index = (exponent - MIN_EXPONENT) * BUCKETS_PER_OCTAVE + int((mantissa - 0.5) * 2 * BUCKETS_PER_OCTAVE)
+        if index < 0:
+            index = 0
+        elif index >= NUM_BUCKETS:
+            index = NUM_BUCKETS - 1
+        try:
+            shard = self._shards[_thread_shard.index]
+        except AttributeError:
+            shard = self._shards[_assign_shard()]
+        with shard.lock:
+            shard.counts[index] += 1
+            shard.count += 1
+            shard.sum += value
+            if value < shard.min:
+                shard.min = value
+            if value > shard.max:
+                shard.max = value
+
+    def state(self) -> Dict[str, Any]:
+        """Raw merged state: non-empty bucket counts plus count/sum/min/max."""
+        counts: Dict[int, int] = {}
+        count, total, low, high = 0, 0.0, math.inf, 0.0
+        for shard in self._shards:
+            with shard.lock:
+                for i, c in enumerate(shard.counts):
+                    if c:
+                        counts[i] = counts.get(i, 0) + c
+                count += shard.count
+                total += shard.sum
+                low = min(low, shard.min)
+                high = max(high, shard.max)
+        return {"counts": counts, "count": count, "sum": total, "min": low, "max": high}
+
+    def shard_counts(self) -> List[int]:
+        """Observations recorded in each shard (shows how recording threads spread)."""
+        return [shard.count for shard in self._shards]
+
+    def snapshot(self) -> Dict[str, float]:
+        """Merged count/sum/min/max/avg and p50/p90/p99/p999 across shards."""
+        return summarize(self.state())
+
+
+def merge_states(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two histogram states (e.g. from different processes)."""
+    counts = dict(a["counts"])
+    for i, c in b["counts"].items():
+        counts[i] = counts.get(i, 0) + c
+    return {"counts": counts, "count": a["count"] + b["count"], "sum": a["sum"] + b["sum"],
+            "min": min(a["min"], b["min"]), "max": max(a["max"], b["max"])}
+
+
+def summarize(state: Dict[str, Any]) -> Dict[str, float]:
+    count, low, high = state["count"], state["min"], state["max"]
+    buckets = sorted(state["counts"].items())
+    result = {
+        "count": count,
+        "sum": state["sum"],
+        "avg": state["sum"] / count if count else 0.0,
+        "min": low if count else 0.0,
+        "max": high,
+    }
+    for q, name in QUANTILES.items():
+        result[name] = _quantile(buckets, count, q, low, high)
+    return result
+
+
+def _quantile(buckets: List[Tuple[int, int]], count: int, q: float, low: float, high: float) -> float:
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    for i, c in buckets:
+        seen += c
+        if seen >= rank:
+            # Clamp to observed extremes so small samples stay exact at the edges
+            return min(max(bucket_value(i), low), high)
+    return high
+
+
+class MetricsRegistry:
+    """Named metric families, each holding one metric per label set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, Dict[str, Any]] = {}
+        self._flusher_pid: Optional[int] = None
+
+    def _get(self, family: str, kind: str, help_text: str, labels: Dict[str, str], factory: Callable):
+        key: LabelKey = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        fam = self._families.get(family)
+        if fam is not None:
+            metric = fam['metrics'].get(key)
+            if metric is not None:
+                return metric
+        self.start_flusher()
+        with self._lock:
+            fam = self._families.setdefault(family, {'kind': kind, 'help': help_text, 'metrics': {}})
+            return fam['metrics'].setdefault(key, factory())
+
+    def counter(self, family: str, help_text: str = "", **labels: str) -> Counter:
+        return self._get(family, 'counter', help_text, labels, Counter)
+
+    def histogram(self, family: str, help_text: str = "", **labels: str) -> Histogram:
+        return self._get(family, 'summary', help_text, labels, Histogram)
+
+    def _local_families(self) -> Dict[str, Dict[str, Any]]:
+        """This process's metrics as raw values: counter totals and histogram states."""
+        with self._lock:
+            families = {name: dict(fam, metrics=dict(fam['metrics'])) for name, fam in self._families.items()}
+        for fam in families.values():
+            fam['metrics'] = {key: m.state() if isinstance(m, Histogram) else m.value
+                              for key, m in fam['metrics'].items()}
+        return families
+
+    def _families_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Raw values for this process, or merged across processes in multiprocess mode."""
+        if not MULTIPROC_DIR:
+            return self._local_families()
+        self.write_snapshot()
+        merged: Dict[str, Dict[str, Any]] = {}
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    exported = json.load(f)
+            except (OSError, ValueError):
+                continue  # replaced or removed while reading
+            for name, fam in exported.items():
+                target = merged.setdefault(name, {'kind': fam['kind'], 'help': fam['help'], 'metrics': {}})
+                for labels, value in fam['metrics']:
+                    key = tuple(tuple(pair) for pair in labels)
+                    if fam['kind'] == 'summary':
+                        value = dict(value, counts={int(i): c for i, c in value['counts'].items()},
+                                     min=math.inf if value['min'] is None else value['min'])
+                    previous = target['metrics'].get(key)
+                    if previous is None:
+                        target['metrics'][key] = value
+                    else:
+                        target['metrics'][key] = (merge_states(previous, value) if fam['kind'] == 'summary'
+                                                  else previous + value)
+        return merged
+
+    def write_snapshot(self) -> None:
+        """Write this process's raw metrics to METRICS_MULTIPROC_DIR (no-op without it)."""
+        if not MULTIPROC_DIR:
+            return
+        exported = {
+            name: {'kind': fam['kind'], 'help': fam['help'], 'metrics': [
+                [list(key), dict(value, min=None if value['min'] == math.inf else value['min'])
+                 if fam['kind'] == 'summary' else value]
+                for key, value in fam['metrics'].items()
+            ]}
+            for name, fam in self._local_families().items()
+        }
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        path = os.path.join(MULTIPROC_DIR, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(exported, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self) -> None:
+        """Periodically write this process's snapshot; restarts itself after a fork."""
+        if not MULTIPROC_DIR or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+        def flush_forever():
+            while True:
+                time.sleep(FLUSH_SECONDS)
+                try:
+                    self.write_snapshot()
+                except OSError:
+                    pass
+
+        threading.Thread(target=flush_forever, name="metrics-flush", daemon=True).start()
+        atexit.register(self.write_snapshot)
+
+    def snapshot(self, family: str) -> Dict[LabelKey, Any]:
+        """Current values of one family, keyed by label set."""
+        metrics = self._families_snapshot().get(family, {}).get('metrics', {})
+        return {key: summarize(value) if isinstance(value, dict) else value for key, value in metrics.items()}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (histograms as summaries)."""
+        families = self._families_snapshot()
+
+        lines = []
+        for name in sorted(families):
+            fam = families[name]
+            if fam['help']:
+                lines.append(f"# HELP {name} {fam['help']}")
+            lines.append(f"# TYPE {name} {fam['kind']}")
+            for key, value in sorted(fam['metrics'].items()):
+                if not isinstance(value, dict):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+                    continue
+                snap = summarize(value)
+                for q, q_name in QUANTILES.items():
+                    lines.append(f"{name}{_format_labels(key, ('quantile', str(q)))} {snap[q_name]:.9g}")
+                lines.append(f"{name}_sum{_format_labels(key)} {snap['sum']:.9g}")
+                lines.append(f"{name}_count{_format_labels(key)} {snap['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+if hasattr(os, 'register_at_fork'):
+    # Forked workers need their own flusher thread writing under their own pid
+    os.register_at_fork(after_in_child=registry.start_flusher)
+
+FUNCTION_FAMILY = "function_duration_seconds"
+REQUEST_FAMILY = "http_request_duration_seconds"
+REQUEST_COUNT_FAMILY = "http_requests_total"
+
+
+def timed(func: Callable) -> Callable:
+    """Record the wall time of every call to func (sync or async) in a histogram."""
+    hist = registry.histogram(FUNCTION_FAMILY, "Wall time of instrumented functions", function=func.__name__)
+    clock = time.perf_counter
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs) -> Any:
+            start = clock()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                hist.observe(clock() - start)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            hist.observe(clock() - start)
+
+    return wrapper
+
+
+def observe_request(route: str, method: str, status: int, seconds: float) -> None:
+    """Record one HTTP request's latency and status."""
+    registry.histogram(REQUEST_FAMILY, "HTTP request latency by route", route=route, method=method).observe(seconds)
+    registry.counter(REQUEST_COUNT_FAMILY, "HTTP requests by route and status",
+                     route=route, method=method, status=str(status)).inc()
+
+
+def function_stats() -> Dict[str, Dict[str, float]]:
+    """Latency summary per timed function, keyed by function name."""
+    return {dict(key)['function']: snap for key, snap in registry.snapshot(FUNCTION_FAMILY).items()}
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
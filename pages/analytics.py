@@ -1,9 +1,30 @@
 import streamlit as st
 import json
-import pandas as pd
+import logging
+import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-import requests
+from typing import Iterable, List, Dict, Optional
+
+from answer_log import get_answer_log
+from cid_cache import get_cid_cache
+from http_client import PINATA_GATEWAY_URL, get_http_client
+from pin_index import sync_pin_index
+from pinata_fetch import fetch_pinned_questions
+from progression_store import ProgressionStore
+from score_checkpoint import (ScoreCheckpointStore, checkpoint_path, diff_states, folds_in_order,
+                              rows_since_checkpoint, state_from_checkpoint)
+from students import session_student_id
+from subjects import DEFAULT_DIFFICULTY_MULTIPLIER, DIFFICULTY_MULTIPLIERS, SUBJECT_MAP
+from swr_cache import get_swr_cache
+
+# "pinata" replays pinned answers; "local" reads the local answer log (offline deployments)
+ANSWER_SOURCE = os.getenv("ANSWER_SOURCE", "pinata")
+
+# Reruns serve the last good result and refresh it in the background once stale
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+analytics_cache = get_swr_cache("analytics", ANALYTICS_CACHE_TTL)
+
+logger = logging.getLogger(__name__)
 
 def load_initial_scores():
     """Load initial personal scores from the session state."""
@@ -14,59 +35,115 @@ def load_initial_scores():
         'English': 13
     }
 
-def get_pinata_questions(jwt_token: str) -> List[Dict]:
-    """Retrieve questions from Pinata."""
-    url = "https://api.pinata.cloud/data/pinList?status=pinned"
-    headers = {"Authorization": f"Bearer {jwt_token}"}
+def get_pinata_questions(jwt_token: str, full_replay: bool = False,
+                         student_id: Optional[str] = None) -> ProgressionStore:
+    """
+    Retrieve questions from Pinata and return their processed score history.
+
+    Unless full_replay is set, only pins newer than the stored checkpoint are
+    fetched and folded into the checkpointed scores. With a student_id only
+    that student's pins are listed and replayed.
+    """
+    state = load_replay_state(jwt_token, full_replay=full_replay, student_id=student_id)
+    return state if state is not None else new_replay_state()
 
+def load_replay_state(jwt_token: str, full_replay: bool = False,
+                      student_id: Optional[str] = None, save: bool = True) -> Optional[ProgressionStore]:
+    """Fetch new pins and fold them into the checkpointed replay state (saved as the new checkpoint if save)."""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        pinned_files = response.json()
-
-        sorted_files = sorted(
-            pinned_files.get('rows', []),
-            key=lambda x: x.get('date_pinned', ''),
-            reverse=True
-        )
-
-        all_questions = []
-        for row in sorted_files:  # Remove the 25 file limit to get all data
-            cid = row.get('ipfs_pin_hash')
-            content = get_file_content(cid)
-            if content:
-                if isinstance(content, list):
-                    all_questions.extend(content)
-                elif isinstance(content, dict):
-                    all_questions.append(content)
-
-        return process_questions(all_questions)
+        # Newest first, from the delta-synced local pin mirror
+        # A full replay also re-lists the pins, dropping any that were unpinned
+        sorted_files = sync_pin_index(jwt_token, student_id, full=full_replay).latest(student_id=student_id)
 
-    except Exception as e:
-        print(f"Error getting pinned questions: {e}")
-        return []
+        initial_scores = load_initial_scores()
+        checkpoint_store = ScoreCheckpointStore(checkpoint_path(student_id))
+        checkpoint = None if full_replay else checkpoint_store.load(initial_scores)
+        new_files = rows_since_checkpoint(sorted_files, checkpoint['last_cid']) if checkpoint else None
+
+        if new_files is None:
+            # No usable checkpoint: replay the whole history
+            state = new_replay_state()
+            new_files = sorted_files
+        else:
+            state = state_from_checkpoint(checkpoint)
+            if not new_files:
+                return state
+
+        all_questions, failures = fetch_pinned_questions(new_files, get_file_content)
+        if len(new_files) < len(sorted_files) and not folds_in_order(state, all_questions):
+            # A late batch holds answers older than the checkpoint's newest; replay
+            # everything so the result matches a full replay's timestamp order
+            older_questions, older_failures = fetch_pinned_questions(sorted_files[len(new_files):],
+                                                                     get_file_content)
+            all_questions += older_questions
+            failures += older_failures
+            state = new_replay_state()
+
+        for failure in failures:
+            logger.warning("Error getting file content for %s: %s", failure.cid, failure.error)
+
+        fold_questions(state, all_questions)
+
+        # Never advance the checkpoint past a pin we failed to read
+        if save and not failures:
+            last_cid = sorted_files[0].get('ipfs_pin_hash') if sorted_files else None
+            checkpoint_store.save(state, last_cid)
+
+        return state
 
-def get_file_content(cid: str) -> Optional[Dict]:
-    """Get content of a file by CID."""
-    url = f"https://gateway.pinata.cloud/ipfs/{cid}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
     except Exception as e:
-        print(f"Error getting file content for {cid}: {e}")
+        logger.error("Error getting pinned questions: %s", e)
+        return None
+
+def load_local_progression() -> ProgressionStore:
+    """Replay the local answer log, streamed segment by segment."""
+    return fold_questions(new_replay_state(), get_answer_log().iter_records())
+
+def load_progression(jwt_token: str, student_id: Optional[str] = None) -> ProgressionStore:
+    """Loader for the analytics cache; raises so a failed refresh keeps the last good result."""
+    if ANSWER_SOURCE == 'local':
+        return load_local_progression()
+    state = load_replay_state(jwt_token, student_id=student_id)
+    if state is None:
+        raise RuntimeError("Failed to load score history")
+    return state
+
+def verify_checkpoint(jwt_token: str, student_id: Optional[str] = None) -> Optional[Dict[str, tuple]]:
+    """
+    Replay the full history and compare it with the stored checkpoint.
+
+    Returns:
+        Optional[Dict[str, tuple]]: Per-subject (checkpoint, replayed) scores
+        that disagree, or None if there was no checkpoint to compare
+    """
+    checkpoint = ScoreCheckpointStore(checkpoint_path(student_id)).load(load_initial_scores())
+    # Read-only: the replay must not overwrite the checkpoint it is checked against
+    replayed = load_replay_state(jwt_token, full_replay=True, student_id=student_id, save=False)
+    if checkpoint is None or replayed is None:
         return None
+    return diff_states(state_from_checkpoint(checkpoint), replayed)
+
+def get_file_content(cid: str) -> Dict:
+    """Get content of a file by CID, reading through the local CID cache; raises on failure."""
+    cache = get_cid_cache()
+    cached = cache.get(cid)
+    if cached is not None:
+        return cached
+
+    url = f"{PINATA_GATEWAY_URL}/ipfs/{cid}"
+    response = get_http_client().get(url)
+    response.raise_for_status()
+    content = response.json()
+    cache.put(cid, content)
+    return content
+
 def calculate_score_change(question: Dict, current_score: float) -> float:
     """
     Calculate score change based on question difficulty and correctness.
     Returns positive value for correct answers, negative for wrong answers.
     """
-    difficulty_map = {
-        'easy': 0.1,
-        'medium': 0.2,
-        'hard': 0.3
-    }
-    difficulty_multiplier = difficulty_map.get(question.get('difficulty', '').lower(), 0.2)
+    difficulty_multiplier = DIFFICULTY_MULTIPLIERS.get(question.get('difficulty', '').lower(),
+                                                       DEFAULT_DIFFICULTY_MULTIPLIER)
     
     # Base change calculation
     growth_factor = 1 + ((abs(18-current_score)/175)) if current_score > 0 else 1
@@ -77,105 +154,115 @@ def calculate_score_change(question: Dict, current_score: float) -> float:
         return base_change  # Positive change for correct answer
     else:
         return -base_change  # Negative change for wrong answer
-def process_questions(questions: List[Dict]) -> List[Dict]:
-    """Process questions and track score progression."""
-    # Standardize subject names
-    subject_map = {
-        'Math': 'Mathematics',
-        'English': 'English',
-        'Science': 'Science',
-        'Reading': 'Reading'
-    }
-    
-    # Initialize scores for each subject
-    current_scores = load_initial_scores()
-    subject_progressions = {subject: [score] for subject, score in current_scores.items()}
-    
-    processed_questions = []
-    
+def new_replay_state() -> ProgressionStore:
+    """Return an empty replay state starting from the initial scores."""
+    return ProgressionStore(load_initial_scores())
+
+def fold_questions(store: ProgressionStore, questions: Iterable[Dict]) -> ProgressionStore:
+    """
+    Fold questions into a replay state in timestamp order, updating it in place.
+
+    Answers whose answer_id is already in the state (a batch pinned twice by
+    an upload retry) are skipped.
+    """
     # Sort questions by timestamp
     sorted_questions = sorted(
         questions,
         key=lambda x: x.get('timestamp', datetime.now().isoformat())
     )
-    
+
     # Process each question and track score changes
     for q in sorted_questions:
         try:
             # Skip if missing critical data
             if not q.get('subject') or not isinstance(q.get('correct'), bool):
                 continue
-                
+            if store.has_answer(q.get('answer_id')):
+                continue
+
             # Map subject name
-            subject = subject_map.get(q.get('subject'), q.get('subject'))
-            if subject not in current_scores:
+            subject = SUBJECT_MAP.get(q.get('subject'), q.get('subject'))
+            if subject not in store:
                 continue
-                
+
             # Calculate new score
-            current_score = current_scores[subject]
+            current_score = store.current_score(subject)
             score_change = calculate_score_change(q, current_score)
             new_score = max(0, round(current_score + score_change, 2))
-            
-            # Update tracking
-            current_scores[subject] = new_score
-            subject_progressions[subject].append(new_score)
-            
-            # Store processed question with progression data
-            processed_q = {
-                'timestamp': q.get('timestamp', datetime.now().isoformat()),
-                'subject': subject,
-                'difficulty': q.get('difficulty', 'medium'),
-                'correct': q.get('correct', False),
-                'previous_score': current_score,
-                'new_score': new_score,
-                'score_change': score_change,
-                'subject_progression': list(subject_progressions[subject])  # Include full progression
-            }
-            
-            processed_questions.append(processed_q)
-            
+
+            store.append(
+                subject,
+                timestamp=q.get('timestamp', datetime.now().isoformat()),
+                difficulty=q.get('difficulty', 'medium'),
+                correct=q.get('correct', False),
+                delta=score_change,
+                new_score=new_score,
+                answer_id=q.get('answer_id')
+            )
+
         except Exception as e:
-            print(f"Error processing question: {e}")
+            logger.warning("Error processing question: %s", e)
             continue
-            
-    return processed_questions
 
-def create_progression_graph(questions: List[Dict]):
+    return store
+
+def process_questions(questions: List[Dict]) -> ProgressionStore:
+    """Process questions and track score progression (full replay)."""
+    return fold_questions(new_replay_state(), questions)
+
+def create_progression_graph(store: ProgressionStore):
     """Create progression graph showing all score changes."""
-    if not questions:
+    if not len(store):
         st.warning("No questions data available to display.")
         return
-        
-    # Prepare data for visualization
-    data_points = []
-    for subject in ['Mathematics', 'Reading', 'Science', 'English']:
-        progression = []
-        current_score = load_initial_scores()[subject]
-        progression.append({'Question': 0, 'Score': current_score, 'Subject': subject})
-        
-        subject_questions = [q for q in questions if q['subject'] == subject]
-        for i, q in enumerate(subject_questions, 1):
-            progression.append({
-                'Question': i,
-                'Score': q['new_score'],
-                'Subject': subject
-            })
-            
-        data_points.extend(progression)
-    
-    # Create DataFrame and plot
-    df = pd.DataFrame(data_points)
-    if not df.empty:
-        chart_data = df.pivot(index='Question', columns='Subject', values='Score')
-        st.line_chart(chart_data)
+
+    # Deferred: pandas is the slowest import on this page and unused without data
+    import pandas as pd
+
+    # One column per subject, indexed by question number (0 = initial score)
+    chart_data = pd.DataFrame({
+        subject: pd.Series(store.progression(subject))
+        for subject in sorted(['Mathematics', 'Reading', 'Science', 'English'])
+    })
+    chart_data.index.name = 'Question'
+    chart_data.columns.name = 'Subject'
+    st.line_chart(chart_data)
 
 def main():
     st.title("Subject Progression Analysis")
     
     sample_token = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJ1c2VySW5mb3JtYXRpb24iOnsiaWQiOiI4YmVmMTM1YS03NDY2LTQ1MjQtODhjMy00MGYzNzg2NmViZDciLCJlbWFpbCI6InNpbW9uZ2FnZTBAZ21haWwuY29tIiwiZW1haWxfdmVyaWZpZWQiOnRydWUsInBpbl9wb2xpY3kiOnsicmVnaW9ucyI6W3siZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiRlJBMSJ9LHsiZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiTllDMSJ9XSwidmVyc2lvbiI6MX0sIm1mYV9lbmFibGVkIjpmYWxzZSwic3RhdHVzIjoiQUNUSVZFIn0sImF1dGhlbnRpY2F0aW9uVHlwZSI6InNjb3BlZEtleSIsInNjb3BlZEtleUtleSI6ImZhNjUxNWZkOTRkMDMyZGQwN2QzIiwic2NvcGVkS2V5U2VjcmV0IjoiOWUyZTRiOTE4NDVjMDA4OWE3YzM0NDdhZDVhZDJkZTAyMTdkNGM5MjExOTI2ODEyZDZmMWRkMDlmYmU2ODA4NCIsImV4cCI6MTc2MzM1NzkxNH0.zpWQXD9YWbE6BKiBavUtGyZJJkrEiZ4x0j1zxzgpmJs"
+    # Only this session's student's pins are listed and replayed
+    student_id = session_student_id()
+    cache_key = (sample_token, student_id)
     
-    # Get and process questions
-    questions = get_pinata_questions(sample_token)
+    # Full replay on demand, checked against the stored checkpoint
+    if ANSWER_SOURCE != 'local' and st.sidebar.button("Verify checkpoint (full replay)"):
+        mismatches = verify_checkpoint(sample_token, student_id)
+        analytics_cache.invalidate(cache_key)
+        if mismatches is None:
+            st.sidebar.info("No checkpoint to verify; history fully replayed.")
+        elif mismatches:
+            st.sidebar.warning(f"Checkpoint differed from full replay: {mismatches}")
+        else:
+            st.sidebar.success("Checkpoint matches full replay.")
+
+    # Get and process questions, served from the stale-while-revalidate cache
+    try:
+        if st.sidebar.button("🔄 Force refresh"):
+            questions, as_of = analytics_cache.refresh(cache_key, lambda: load_progression(sample_token, student_id))
+        else:
+            questions, as_of = analytics_cache.get(cache_key, lambda: load_progression(sample_token, student_id))
+    except Exception as e:
+        st.error(f"Could not load score history: {e}")
+        questions, as_of = new_replay_state(), None
+
+    if as_of is not None:
+        status = " (refreshing…)" if analytics_cache.is_refreshing(cache_key) else ""
+        st.caption(f"Data as of {datetime.fromtimestamp(as_of).strftime('%Y-%m-%d %H:%M:%S')}{status}")
+    refresh_error = analytics_cache.last_error(cache_key)
+    if refresh_error:
+        st.caption(f"⚠️ Last background refresh failed: {refresh_error}")
     
     # Display graph
     st.subheader("Subject Score Progression")
@@ -185,25 +272,15 @@ def main():
     st.subheader("Current Statistics")
     cols = st.columns(4)
     
-    # Group questions by subject
+    # Read per-subject statistics straight from the columnar store
     subject_stats = {}
     for subject in ['Mathematics', 'Reading', 'Science', 'English']:
-        subject_qs = [q for q in questions if q['subject'] == subject]
-        if subject_qs:
-            initial_score = load_initial_scores()[subject]
-            final_score = subject_qs[-1]['new_score'] if subject_qs else initial_score
-            subject_stats[subject] = {
-                'current_score': final_score,
-                'change': final_score - initial_score,
-                'questions_count': len(subject_qs)
-            }
-        else:
-            subject_stats[subject] = {
-                'current_score': load_initial_scores()[subject],
-                'change': 0,
-                'questions_count': 0
-            }
-    
+        subject_stats[subject] = {
+            'current_score': questions.current_score(subject),
+            'change': questions.current_score(subject) - load_initial_scores()[subject],
+            'questions_count': questions.count(subject)
+        }
+
     # Display metrics
     for idx, subject in enumerate(['Mathematics', 'Reading', 'Science', 'English']):
         stats = subject_stats[subject]
@@ -215,6 +292,12 @@ def main():
             )
             st.caption(f"Questions Answered: {stats['questions_count']}")
 
+    cache_stats = get_cid_cache().stats()
+    st.sidebar.caption(
+        f"CID cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['entries']} entries)"
+    )
+
 if __name__ == "__main__":
     st.set_page_config(
         page_title="Subject Progression",
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from http_client import PINATA_API_URL, get_http_client
+from students import STUDENT_KEY, student_pin_filter
+
+PIN_LIST_URL = f"{PINATA_API_URL}/data/pinList"
+PAGE_LIMIT = 1000  # Largest page pinList accepts
+DEFAULT_INDEX_DIR = os.getenv("PIN_INDEX_DIR", "data")
+# A scope is delta-synced at most this often; requests in between read the mirror as-is
+SYNC_SECONDS = float(os.getenv("PIN_INDEX_SYNC_SECONDS", "10"))
+# Delta syncs never see unpins; a full re-list drops them this often
+RECONCILE_SECONDS = float(os.getenv("PIN_INDEX_RECONCILE_SECONDS", str(6 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+class PinIndex:
+    """
+    Local mirror of an account's pin metadata.
+
+    Rows are kept in SQLite, indexed by date_pinned, and returned in the same
+    shape as pinList rows so callers can use them interchangeably. sync()
+    pages through pinList newest first, asking only for pins at or after the
+    newest date_pinned already mirrored; sync(full=True) re-lists everything
+    and drops pins that are no longer pinned. Syncs and reads can be scoped to one
+    student, in which case pinList filters by the student_id key-value and
+    only that student's pins are transferred.
+    """
+
+    def __init__(self, jwt_token: str, path: str):
+        self.jwt_token = jwt_token
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # Several server workers may sync and read the same index
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pins ("
+            " cid TEXT PRIMARY KEY,"
+            " date_pinned TEXT NOT NULL,"
+            " size INTEGER,"
+            " name TEXT,"
+            " keyvalues TEXT,"
+            " student_id TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pins_date ON pins (date_pinned)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pins_student ON pins (student_id, date_pinned)")
+        # Each scope ('' for the whole account, else a student ID) has its own high-water mark
+        # and sync times, since a student-scoped sync says nothing about other students' pins
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_scopes ("
+            " scope TEXT PRIMARY KEY,"
+            " high_water TEXT,"
+            " synced_at REAL,"
+            " reconciled_at REAL)"
+        )
+        self._conn.commit()
+
+    def high_water_mark(self, student_id: Optional[str] = None) -> Optional[str]:
+        """Return the newest date_pinned synced for the account, or for one student."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water FROM sync_scopes WHERE scope = ?", (student_id or '',)
+            ).fetchone()
+        return row[0] if row else None
+
+    def sync_due(self, student_id: Optional[str] = None) -> bool:
+        """True if the scope has not been synced within SYNC_SECONDS."""
+        return self._elapsed_since("synced_at", student_id) >= SYNC_SECONDS
+
+    def reconcile_due(self, student_id: Optional[str] = None) -> bool:
+        """True if the scope has not been fully re-listed within RECONCILE_SECONDS."""
+        return self._elapsed_since("reconciled_at", student_id) >= RECONCILE_SECONDS
+
+    def _elapsed_since(self, column: str, student_id: Optional[str]) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM sync_scopes WHERE scope = ?", (student_id or '',)
+            ).fetchone()
+        return time.time() - row[0] if row and row[0] is not None else float('inf')
+
+    def sync(self, full: bool = False, student_id: Optional[str] = None) -> int:
+        """
+        Pull new pins from Pinata into the local index.
+
+        Args:
+            full: Re-list every pin and drop ones no longer pinned
+            student_id: Only list this student's pins
+
+        Returns:
+            int: Number of rows received from pinList
+        """
+        since = None if full else self.high_water_mark(student_id)
+        headers = {"Authorization": f"Bearer {self.jwt_token}"}
+        params = {"status": "pinned", "pageLimit": PAGE_LIMIT}
+        if since:
+            # pinStart is inclusive; re-seen rows are simply upserted
+            params["pinStart"] = since
+        if student_id:
+            params["metadata[keyvalues]"] = student_pin_filter(student_id)
+
+        received = {}
+        while True:
+            response = get_http_client().get(PIN_LIST_URL, headers=headers, params=params)
+            response.raise_for_status()
+            rows = [row for row in response.json().get('rows', []) if row.get('ipfs_pin_hash')]
+            new = [row for row in rows if row['ipfs_pin_hash'] not in received]
+            received.update((row['ipfs_pin_hash'], row) for row in new)
+            if len(rows) < PAGE_LIMIT or not new:
+                break
+            # Rows come newest first. Continue from the oldest date on this page rather than
+            # by pageOffset, which skips rows when pins are removed mid-listing; pinEnd is
+            # inclusive, so that page's oldest rows come back and are de-duplicated by CID
+            params["pinEnd"] = min(row.get('date_pinned', '') for row in rows)
+
+        high_water = max((row.get('date_pinned', '') for row in received.values()), default=since)
+        with self._lock:
+            if full and student_id:
+                self._conn.execute("DELETE FROM pins WHERE student_id = ?", (student_id,))
+            elif full:
+                self._conn.execute("DELETE FROM pins")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pins (cid, date_pinned, size, name, keyvalues, student_id)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        row['ipfs_pin_hash'],
+                        row.get('date_pinned', ''),
+                        row.get('size'),
+                        (row.get('metadata') or {}).get('name'),
+                        json.dumps((row.get('metadata') or {}).get('keyvalues') or {}),
+                        ((row.get('metadata') or {}).get('keyvalues') or {}).get(STUDENT_KEY)
+                    )
+                    for row in received.values()
+                ]
+            )
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO sync_scopes (scope, high_water, synced_at, reconciled_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (scope) DO UPDATE SET"
+                " high_water = COALESCE(excluded.high_water, high_water),"
+                " synced_at = excluded.synced_at,"
+                " reconciled_at = COALESCE(excluded.reconciled_at, reconciled_at)",
+                (student_id or '', high_water or None, now, now if full else None)
+            )
+            self._conn.commit()
+        return len(received)
+
+    def latest(self, limit: Optional[int] = None, student_id: Optional[str] = None) -> List[Dict]:
+        """Return the newest pins first (optionally one student's), limited to the last N."""
+        query = "SELECT cid, date_pinned, size, name, keyvalues FROM pins"
+        params = ()
+        if student_id:
+            query += " WHERE student_id = ?"
+            params = (student_id,)
+        query += " ORDER BY date_pinned DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return self._query(query, params)
+
+    def _query(self, query: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                'ipfs_pin_hash': cid,
+                'date_pinned': date_pinned,
+                'size': size,
+                'metadata': {'name': name, 'keyvalues': json.loads(keyvalues or '{}')}
+            }
+            for cid, date_pinned, size, name, keyvalues in rows
+        ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_pin_index(jwt_token: str) -> PinIndex:
+    """Return the pin index for an account, one SQLite file per token."""
+    with _indexes_lock:
+        index = _indexes.get(jwt_token)
+        if index is None:
+            token_hash = hashlib.sha256(jwt_token.encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(DEFAULT_INDEX_DIR, f"pin_index_{token_hash}.sqlite3")
+            index = _indexes[jwt_token] = PinIndex(jwt_token, path)
+        return index
+
+
+def sync_pin_index(jwt_token: str, student_id: Optional[str] = None, full: bool = False) -> PinIndex:
+    """
+    Sync the account's pin index and return it.
+
+    A scope is fully re-listed (dropping unpinned CIDs) when full is set or
+    RECONCILE_SECONDS have passed since its last full listing; otherwise it
+    is delta-synced, at most once every SYNC_SECONDS. With a student_id only
+    that student's pins are listed. A failed sync is logged and the existing
+    local mirror is served as-is.
+    """
+    index = get_pin_index(jwt_token)
+    try:
+        if full or index.reconcile_due(student_id):
+            index.sync(full=True, student_id=student_id)
+        elif index.sync_due(student_id):
+            index.sync(student_id=student_id)
+    except Exception as e:
+        logger.warning("Pin index sync failed, serving local mirror: %s", e)
+    return index
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bound on simultaneous gateway requests, overridable per deployment
+DEFAULT_MAX_WORKERS = int(os.getenv("PINATA_FETCH_CONCURRENCY", "16"))
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a single CID."""
+    cid: str
+    content: Optional[Any] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _fetch_one(cid: str, fetch_fn: Callable[[str], Any]) -> FetchResult:
+    try:
+        content = fetch_fn(cid)
+    except Exception as e:
+        return FetchResult(cid=cid, error=str(e))
+
+    if content is None:
+        return FetchResult(cid=cid, error="No content returned")
+    return FetchResult(cid=cid, content=content)
+
+
+def fetch_cids(cids: Iterable[str],
+               fetch_fn: Callable[[str], Any],
+               max_workers: Optional[int] = None) -> List[FetchResult]:
+    """
+    Fetch many CIDs in parallel with bounded concurrency.
+
+    Args:
+        cids: CIDs to fetch, in the order results should be returned
+        fetch_fn: Function fetching the content of one CID
+        max_workers: Concurrency ceiling (defaults to PINATA_FETCH_CONCURRENCY)
+
+    Returns:
+        List[FetchResult]: One result per CID, in input order. Failures are
+        reported on the result instead of aborting the batch.
+    """
+    cids = list(cids)
+    if not cids:
+        return []
+
+    workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(cids)))
+    if workers == 1:
+        return [_fetch_one(cid, fetch_fn) for cid in cids]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cid-fetch") as executor:
+        # map() yields in submission order regardless of completion order
+        return list(executor.map(lambda cid: _fetch_one(cid, fetch_fn), cids))
+
+
+def sort_pinned_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """Sort pinList rows newest first by 'date_pinned'."""
+    return sorted(rows, key=lambda x: x.get('date_pinned', ''), reverse=True)
+
+
+def fetch_pinned_questions(rows: Iterable[Dict],
+                           fetch_fn: Callable[[str], Any],
+                           max_workers: Optional[int] = None) -> Tuple[List[Dict], List[FetchResult]]:
+    """
+    Fetch and flatten the question records stored in pinned rows.
+
+    Args:
+        rows: pinList rows, already in the desired 'date_pinned' order
+        fetch_fn: Function fetching the content of one CID
+        max_workers: Concurrency ceiling
+
+    Returns:
+        Tuple[List[Dict], List[FetchResult]]: Flattened questions in row order,
+        and the results of every CID that failed to fetch
+    """
+    cids = [row.get('ipfs_pin_hash') for row in rows if row.get('ipfs_pin_hash')]
+    results = fetch_cids(cids, fetch_fn, max_workers=max_workers)
+
+    all_questions = []
+    failures = []
+    for result in results:
+        if not result.ok:
+            failures.append(result)
+            continue
+        # A pin holds either a list of questions or a single question dict
+        if isinstance(result.content, list):
+            all_questions.extend(result.content)
+        elif isinstance(result.content, dict):
+            all_questions.append(result.content)
+
+    return all_questions, failures
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPTH = int(os.getenv("PREFETCH_DEPTH", "2"))
+DEFAULT_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+DEFAULT_MAX_AGE_SECONDS = float(os.getenv("PREFETCH_MAX_AGE", "600"))
+DEFAULT_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_TIMEOUT", "1800"))
+
+
+class PrefetchPool:
+    """
+    Keeps a small queue of ready results per key, refilled in the background.
+
+    take() pops a ready item without blocking and schedules a refill, so a
+    key always has up to `depth` items queued or in flight. Items older than
+    max_age_seconds are discarded, and keys not touched for idle_seconds are
+    dropped. Producers run on a shared pool of `concurrency` threads and must
+    not touch any UI state.
+    """
+
+    def __init__(self, depth: int = DEFAULT_DEPTH,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+                 idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.depth = depth
+        self.max_age_seconds = max_age_seconds
+        self.idle_seconds = idle_seconds
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prefetch")
+        self._queues: Dict[Hashable, Dict] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: Hashable, producer: Callable[[], Any]) -> Optional[Any]:
+        """
+        Pop a ready item for a key, or None if nothing fresh is queued.
+
+        Either way the key's queue is topped back up in the background.
+        """
+        with self._lock:
+            slot = self._slot(key)
+            cutoff = time.time() - self.max_age_seconds
+            while slot['ready'] and slot['ready'][0][1] < cutoff:
+                slot['ready'].popleft()
+            item = slot['ready'].popleft()[0] if slot['ready'] else None
+        self.fill(key, producer)
+        return item
+
+    def fill(self, key: Hashable, producer: Callable[[], Any]) -> None:
+        """Schedule producers until the key has `depth` items queued or in flight."""
+        with self._lock:
+            slot = self._slot(key)
+            missing = self.depth - len(slot['ready']) - slot['in_flight']
+            slot['in_flight'] += max(0, missing)
+            self._drop_idle()
+
+        for _ in range(max(0, missing)):
+            self._executor.submit(self._produce, key, producer)
+
+    def ready_count(self, key: Hashable) -> int:
+        with self._lock:
+            slot = self._queues.get(key)
+            return len(slot['ready']) if slot else 0
+
+    def _produce(self, key: Hashable, producer: Callable[[], Any]) -> None:
+        item = None
+        try:
+            item = producer()
+        except Exception as e:
+            logger.warning("Prefetch for %r failed: %s", key, e)
+        finally:
+            with self._lock:
+                slot = self._queues.get(key)
+                if slot is not None:
+                    slot['in_flight'] -= 1
+                    if item is not None:
+                        slot['ready'].append((item, time.time()))
+
+    def _slot(self, key: Hashable) -> Dict:
+        # Caller holds the lock
+        slot = self._queues.get(key)
+        if slot is None:
+            slot = self._queues[key] = {'ready': deque(), 'in_flight': 0, 'touched': 0.0}
+        slot['touched'] = time.time()
+        return slot
+
+    def _drop_idle(self) -> None:
+        # Caller holds the lock
+        cutoff = time.time() - self.idle_seconds
+        for key in [k for k, slot in self._queues.items() if slot['touched'] < cutoff]:
+            del self._queues[key]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_prefetch_pool() -> PrefetchPool:
+    """Return the process-wide prefetch pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PrefetchPool()
+    return _pool
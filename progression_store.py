@@ -0,0 +1,111 @@
+from array import array
+from typing import Dict, Iterator, Optional, Set
+
+
+class ProgressionStore:
+    """
+    Columnar score history for one student.
+
+    Each subject keeps growable columns: scores (starting with the initial
+    score, so scores[i] is the score after i answers), deltas, timestamps,
+    correctness and difficulty. The global answer order is kept as two
+    parallel columns of (subject, offset) so the full history can be walked
+    in replay order without materializing per-answer records. The IDs of
+    folded answers are kept so a re-uploaded answer is never counted twice.
+    """
+
+    def __init__(self, initial_scores: Dict[str, float]):
+        self.initial_scores = dict(initial_scores)
+        self.subjects = list(initial_scores)
+        self._subject_index = {subject: j for j, subject in enumerate(self.subjects)}
+        self.scores = {subject: array('d', [score]) for subject, score in initial_scores.items()}
+        self.deltas = {subject: array('d') for subject in self.subjects}
+        self.correct = {subject: array('b') for subject in self.subjects}
+        self.timestamps = {subject: [] for subject in self.subjects}
+        self.difficulties = {subject: [] for subject in self.subjects}
+        self.order_subject = array('b')
+        self.order_offset = array('l')
+        self.answer_ids: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.order_subject)
+
+    def __contains__(self, subject: str) -> bool:
+        return subject in self._subject_index
+
+    def has_answer(self, answer_id: Optional[str]) -> bool:
+        return answer_id is not None and answer_id in self.answer_ids
+
+    def append(self, subject: str, timestamp: str, difficulty: str, correct: bool,
+               delta: float, new_score: float, answer_id: Optional[str] = None) -> None:
+        """Record one answer for a subject."""
+        if answer_id is not None:
+            self.answer_ids.add(answer_id)
+        self.order_subject.append(self._subject_index[subject])
+        self.order_offset.append(len(self.deltas[subject]))
+        self.scores[subject].append(new_score)
+        self.deltas[subject].append(delta)
+        self.correct[subject].append(correct)
+        self.timestamps[subject].append(timestamp)
+        self.difficulties[subject].append(difficulty)
+
+    def current_score(self, subject: str) -> float:
+        return self.scores[subject][-1]
+
+    def count(self, subject: str) -> int:
+        return len(self.deltas[subject])
+
+    def progression(self, subject: str) -> array:
+        """Scores after each answer, including the initial score (not a copy)."""
+        return self.scores[subject]
+
+    @property
+    def current_scores(self) -> Dict[str, float]:
+        return {subject: self.current_score(subject) for subject in self.subjects}
+
+    @property
+    def last_timestamp(self) -> Optional[str]:
+        latest = [ts[-1] for ts in self.timestamps.values() if ts]
+        return max(latest) if latest else None
+
+    def records(self) -> Iterator[Dict]:
+        """Yield answers in replay order as process_questions-style dicts."""
+        for j, offset in zip(self.order_subject, self.order_offset):
+            subject = self.subjects[j]
+            yield {
+                'timestamp': self.timestamps[subject][offset],
+                'subject': subject,
+                'difficulty': self.difficulties[subject][offset],
+                'correct': bool(self.correct[subject][offset]),
+                'previous_score': self.scores[subject][offset],
+                'new_score': self.scores[subject][offset + 1],
+                'score_change': self.deltas[subject][offset]
+            }
+
+    def to_dict(self) -> Dict:
+        """Serialize to plain lists for JSON persistence."""
+        return {
+            'initial_scores': self.initial_scores,
+            'scores': {s: list(v) for s, v in self.scores.items()},
+            'deltas': {s: list(v) for s, v in self.deltas.items()},
+            'correct': {s: list(v) for s, v in self.correct.items()},
+            'timestamps': self.timestamps,
+            'difficulties': self.difficulties,
+            'order_subject': list(self.order_subject),
+            'order_offset': list(self.order_offset),
+            'answer_ids': sorted(self.answer_ids)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProgressionStore':
+        store = cls(data['initial_scores'])
+        for subject in store.subjects:
+            store.scores[subject] = array('d', data['scores'][subject])
+            store.deltas[subject] = array('d', data['deltas'][subject])
+            store.correct[subject] = array('b', data['correct'][subject])
+            store.timestamps[subject] = list(data['timestamps'][subject])
+            store.difficulties[subject] = list(data['difficulties'][subject])
+        store.order_subject = array('b', data['order_subject'])
+        store.order_offset = array('l', data['order_offset'])
+        store.answer_ids = set(data['answer_ids'])
+        return store
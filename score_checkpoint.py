@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from progression_store import ProgressionStore
+from students import student_slug
+
+DEFAULT_CHECKPOINT_PATH = os.getenv("SCORE_CHECKPOINT_PATH", os.path.join("data", "score_checkpoint.json"))
+CHECKPOINT_VERSION = 1
+
+# One lock per checkpoint file, so concurrent saves in a process are serialized
+_save_locks: Dict[str, threading.Lock] = {}
+_save_locks_lock = threading.Lock()
+
+
+class ScoreCheckpointStore:
+    """
+    Persists a score replay state so later runs only fold in new answers.
+
+    A checkpoint records the replay state (a serialized ProgressionStore)
+    together with the newest pin CID and answer timestamp it covers. It is
+    written atomically as JSON.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+
+    def load(self, initial_scores: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Load the checkpoint, if one exists and is still usable.
+
+        Args:
+            initial_scores: Starting scores the caller replays from. A
+                checkpoint built from different starting scores is discarded.
+
+        Returns:
+            Optional[Dict]: The checkpoint, or None if missing or stale
+        """
+        try:
+            with open(self.path, 'r') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            return None
+        if initial_scores is not None and checkpoint.get('initial_scores') != initial_scores:
+            return None
+        return checkpoint
+
+    def save(self, store: ProgressionStore, last_cid: Optional[str]) -> None:
+        """Write the replay state as the new checkpoint."""
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'saved_at': time.time(),
+            'initial_scores': store.initial_scores,
+            'last_cid': last_cid,
+            'last_timestamp': store.last_timestamp,
+            'current_scores': store.current_scores,
+            'store': store.to_dict(),
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with _save_locks_lock:
+            lock = _save_locks.setdefault(os.path.abspath(self.path), threading.Lock())
+        with lock:
+            # A unique temp file per save: a crash never leaves a torn checkpoint, and
+            # writers in other processes never replace each other's half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(self.path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(checkpoint, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+    def clear(self) -> None:
+        """Delete the checkpoint, forcing the next run to replay everything."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def checkpoint_path(student_id: Optional[str] = None) -> str:
+    """Checkpoint file for one student's replay, or the whole account's when student_id is None."""
+    slug = student_slug(student_id)
+    if not slug:
+        return DEFAULT_CHECKPOINT_PATH
+    root, ext = os.path.splitext(DEFAULT_CHECKPOINT_PATH)
+    return f"{root}_{slug}{ext}"
+
+
+def state_from_checkpoint(checkpoint: Dict) -> ProgressionStore:
+    """Rebuild a replay state from a loaded checkpoint."""
+    return ProgressionStore.from_dict(checkpoint['store'])
+
+
+def rows_since_checkpoint(rows: List[Dict], last_cid: Optional[str]) -> Optional[List[Dict]]:
+    """
+    Return the pinList rows pinned after the checkpointed CID.
+
+    Args:
+        rows: pinList rows sorted newest first
+        last_cid: Newest CID covered by the checkpoint
+
+    Returns:
+        Optional[List[Dict]]: Newer rows, or None if the CID is no longer
+        listed and the checkpoint cannot be trusted
+    """
+    for idx, row in enumerate(rows):
+        if row.get('ipfs_pin_hash') == last_cid:
+            return rows[:idx]
+    return None
+
+
+def folds_in_order(store: ProgressionStore, questions: List[Dict]) -> bool:
+    """
+    Whether folding questions into a checkpointed state gives what a full replay would.
+
+    A full replay folds every answer in timestamp order. A batch pinned late
+    can hold answers no newer than ones already folded; those need a full
+    replay instead.
+    """
+    last = store.last_timestamp
+    if last is None:
+        return True
+    return all(q.get('timestamp') is None or q['timestamp'] > last
+               for q in questions if not store.has_answer(q.get('answer_id')))
+
+
+def diff_states(expected: ProgressionStore, actual: ProgressionStore) -> Dict[str, tuple]:
+    """Return per-subject (expected, actual) final scores that disagree."""
+    mismatches = {}
+    for subject in expected.subjects:
+        if subject not in actual or expected.progression(subject) != actual.progression(subject):
+            other = actual.current_score(subject) if subject in actual else None
+            mismatches[subject] = (expected.current_score(subject), other)
+    return mismatches
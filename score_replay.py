@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from subjects import DEFAULT_DIFFICULTY_MULTIPLIER, DIFFICULTY_MULTIPLIERS, SUBJECTS, SUBJECT_MAP
+
+
+@dataclass
+class AnswerBatch:
+    """Answers for many students held as parallel arrays, sorted by (student, time)."""
+    student_ids: List[str]
+    student: np.ndarray     # int index into student_ids
+    subject: np.ndarray     # int index into SUBJECTS
+    multiplier: np.ndarray  # difficulty multiplier
+    correct: np.ndarray     # bool
+    time: np.ndarray        # sortable timestamp strings
+    rank: np.ndarray        # position of the answer within its student's history
+
+    def __len__(self) -> int:
+        return len(self.student)
+
+
+@dataclass
+class ReplayResult:
+    """Per-answer score updates (in batch order) and final scores per student."""
+    batch: AnswerBatch
+    previous_score: np.ndarray
+    score_change: np.ndarray
+    new_score: np.ndarray
+    final_scores: np.ndarray  # shape (students, subjects)
+
+    def scores_by_student(self) -> Dict[str, Dict[str, float]]:
+        return {
+            student_id: {subject: float(self.final_scores[i, j]) for j, subject in enumerate(SUBJECTS)}
+            for i, student_id in enumerate(self.batch.student_ids)
+        }
+
+    def progression(self, student_id: str, subject: str) -> np.ndarray:
+        """Scores for one student and subject after each answer (excluding the initial score)."""
+        i = self.batch.student_ids.index(student_id)
+        j = SUBJECTS.index(subject)
+        return self.new_score[(self.batch.student == i) & (self.batch.subject == j)]
+
+
+def build_answer_batch(answers: Iterable[Dict], student_key: str = 'student_id') -> AnswerBatch:
+    """
+    Convert answer dicts into an AnswerBatch.
+
+    Answers are filtered exactly like process_questions: entries without a
+    subject, with a non-bool 'correct', or with an unknown subject are dropped,
+    as are repeats of an answer_id already seen. Answers without a
+    student_key are grouped under the empty student ID.
+    """
+    student_index = {}
+    answer_ids = set()
+    students, subjects, multipliers, corrects, times = [], [], [], [], []
+    subject_index = {subject: j for j, subject in enumerate(SUBJECTS)}
+
+    for q in answers:
+        if not q.get('subject') or not isinstance(q.get('correct'), bool):
+            continue
+        subject = SUBJECT_MAP.get(q.get('subject'), q.get('subject'))
+        if subject not in subject_index:
+            continue
+        answer_id = q.get('answer_id')
+        if answer_id is not None:
+            if answer_id in answer_ids:
+                continue
+            answer_ids.add(answer_id)
+
+        student_id = str(q.get(student_key, ''))
+        if student_id not in student_index:
+            student_index[student_id] = len(student_index)
+
+        students.append(student_index[student_id])
+        subjects.append(subject_index[subject])
+        multipliers.append(DIFFICULTY_MULTIPLIERS.get(q.get('difficulty', '').lower(), DEFAULT_DIFFICULTY_MULTIPLIER))
+        corrects.append(q['correct'])
+        times.append(q.get('timestamp', datetime.now().isoformat()))
+
+    student = np.asarray(students, dtype=np.int64)
+    time = np.asarray(times, dtype=str)
+
+    # Stable sort by student, then timestamp, matching sorted() in process_questions
+    order = np.lexsort((time, student)) if len(student) else np.zeros(0, dtype=np.int64)
+    student = student[order]
+
+    # Rank of each answer within its student's history
+    rank = np.arange(len(student), dtype=np.int64)
+    if len(student):
+        starts = np.r_[0, np.flatnonzero(np.diff(student)) + 1]
+        rank -= np.repeat(starts, np.diff(np.r_[starts, len(student)]))
+
+    return AnswerBatch(
+        student_ids=list(student_index),
+        student=student,
+        subject=np.asarray(subjects, dtype=np.int64)[order],
+        multiplier=np.asarray(multipliers, dtype=np.float64)[order],
+        correct=np.asarray(corrects, dtype=bool)[order],
+        time=time[order],
+        rank=rank
+    )
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """Round to 2 decimals with the same result as Python's round(x, 2)."""
+    rounded = np.round(values, 2)
+    # np.round scales by 100 first, which can land on the wrong side of an
+    # exact half; defer those rare near-ties to Python's correctly rounded round()
+    scaled = values * 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in np.flatnonzero(near_tie):
+        rounded[idx] = round(float(values[idx]), 2)
+    return rounded
+
+
+def replay_batch(batch: AnswerBatch, initial_scores: Dict[str, float],
+                 initial_by_student: Optional[Dict[str, Dict[str, float]]] = None) -> ReplayResult:
+    """
+    Replay score progressions for every student at once.
+
+    Each step advances the k-th answer of every student simultaneously; a
+    student contributes at most one answer per step, so updates never collide.
+
+    Args:
+        batch: Answers to replay
+        initial_scores: Starting score per subject
+        initial_by_student: Optional per-student overrides of initial_scores
+
+    Returns:
+        ReplayResult: Matches calculate_score_change/process_questions exactly
+    """
+    scores = np.tile(np.asarray([initial_scores[s] for s in SUBJECTS], dtype=np.float64),
+                     (len(batch.student_ids), 1))
+    for student_id, overrides in (initial_by_student or {}).items():
+        if student_id in batch.student_ids:
+            i = batch.student_ids.index(student_id)
+            for j, subject in enumerate(SUBJECTS):
+                if subject in overrides:
+                    scores[i, j] = overrides[subject]
+
+    previous_score = np.zeros(len(batch), dtype=np.float64)
+    score_change = np.zeros(len(batch), dtype=np.float64)
+    new_score = np.zeros(len(batch), dtype=np.float64)
+
+    # Group answer positions by rank once, so each step is a plain gather/scatter
+    order = np.argsort(batch.rank, kind='stable')
+    bounds = np.searchsorted(batch.rank[order], np.arange(batch.rank.max() + 2)) if len(batch) else [0]
+
+    for k in range(len(bounds) - 1):
+        idx = order[bounds[k]:bounds[k + 1]]
+        s = batch.student[idx]
+        j = batch.subject[idx]
+        current = scores[s, j]
+
+        growth_factor = np.where(current > 0, 1 + (np.abs(18 - current) / 175), 1)
+        base_change = growth_factor * batch.multiplier[idx] * current
+        change = np.where(batch.correct[idx], base_change, -base_change)
+        updated = np.maximum(0, _round2(current + change))
+
+        scores[s, j] = updated
+        previous_score[idx] = current
+        score_change[idx] = change
+        new_score[idx] = updated
+
+    return ReplayResult(
+        batch=batch,
+        previous_score=previous_score,
+        score_change=score_change,
+        new_score=new_score,
+        final_scores=scores
+    )
@@ -1,22 +1,21 @@
 import streamlit as st
-import json
-import openai
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 from datetime import datetime
-import requests
 from dotenv import load_dotenv
-from math import ceil
+
+from answer_spool import get_answer_spool
+from generation_cache import get_generation_cache, is_cacheable, profile_key
+from http_client import PINATA_API_URL, get_http_client
+from llm_client import get_llm_client
+from llm_json import completion_deltas, extract_json_objects, iter_array_objects
+from prefetch_pool import get_prefetch_pool
+from students import STUDENT_KEY, session_student_id
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI client for SambaNova
-SAMBANOVA_API_KEY = os.getenv("SAMBANOVA_API_KEY", "cf134cde-f4d2-4e6d-90b4-500e269eb286")
-client = openai.OpenAI(
-    api_key=SAMBANOVA_API_KEY,
-    base_url="https://api.sambanova.ai/v1"
-)
+# The SambaNova client is created on first use (llm_client), not on every script rerun
 
 # Sample USA results for comparison
 SAMPLE_USA_RESULTS = {
@@ -26,13 +25,33 @@ SAMPLE_USA_RESULTS = {
     "Science": 21
 }
 
+# Bump whenever the generation prompt changes so cached sets are not reused
+PROMPT_VERSION = "streamlit-v1"
+
+# Render question cards as the completion streams in
+STREAM_QUESTIONS = os.getenv("STREAM_QUESTIONS", "true").lower() == "true"
+
 def next_question_set():
-    """Generate a new set of questions and increment the set number."""
+    """Show the next set of questions and increment the set number."""
+    # The finished set's answers go out together, in the background
+    get_answer_spool(pin_answer_batch).request_flush()
     st.session_state.question_set_number += 1
-    st.session_state.questions = generate_questions(
-        st.session_state.personal_data,
-        st.session_state.regional_data
+    personal_data = st.session_state.personal_data
+    regional_data = st.session_state.regional_data
+    viewer = session_student_id()
+
+    # Pop a prefetched set if one is ready; the pool refills itself in the background
+    questions = get_prefetch_pool().take(
+        prefetch_key(personal_data, regional_data, viewer),
+        lambda: prefetch_validated_set(dict(personal_data), dict(regional_data), viewer)
     )
+    if questions is None and STREAM_QUESTIONS:
+        # Nothing prefetched yet: stream the next set into the grid instead of blocking
+        st.session_state.stream_request = (personal_data, regional_data)
+        questions = []
+    elif questions is None:
+        questions = generate_questions(personal_data, regional_data)
+    st.session_state.questions = questions
 
 def display_question_card(question: Dict, index: int) -> None:
     """Display an individual question card with interactive elements."""
@@ -110,23 +129,22 @@ def display_question_card(question: Dict, index: int) -> None:
         st.error(f"Error displaying question: {str(e)}")
         st.write("Raw question data:", question)
 
-def display_questions_grid(questions: List[Dict]) -> None:
-    """Display questions in a responsive grid layout."""
-    num_questions = len(questions)
-    num_rows = ceil(num_questions / 2)
-
-    for row in range(num_rows):
-        col1, col2 = st.columns(2)
-
-        first_idx = row * 2
-        if first_idx < num_questions:
-            with col1:
-                display_question_card(questions[first_idx], first_idx)
-
-        second_idx = row * 2 + 1
-        if second_idx < num_questions:
-            with col2:
-                display_question_card(questions[second_idx], second_idx)
+def display_questions_grid(questions: Iterable[Dict]) -> List[Dict]:
+    """
+    Display questions in a responsive grid layout.
+
+    Accepts a list or a generator; with a generator each card is rendered as
+    soon as its question arrives. Returns the questions that were displayed.
+    """
+    displayed = []
+    columns = None
+    for idx, question in enumerate(questions):
+        # Two cards per row
+        if idx % 2 == 0:
+            columns = st.columns(2)
+        with columns[idx % 2]:
+            display_question_card(question, idx)
+        displayed.append(question)
 
     # Add Next button after all questions
     col1, col2, col3 = st.columns([1, 1, 1])
@@ -134,6 +152,8 @@ def display_questions_grid(questions: List[Dict]) -> None:
         if st.button("Next Questions ➡️", key="next_questions"):
             next_question_set()
             st.rerun()
+
+    return displayed
 import streamlit as st
 from datetime import datetime, timedelta
 import time
@@ -196,107 +216,223 @@ class RateLimitedButton:
             return True
             
         return False
-def generate_questions(personal_data: Dict, regional_data: Dict) -> Optional[List[Dict]]:
-    """Generate questions using the LLaMA API directly in Streamlit."""
+class QuestionGenerationError(Exception):
+    """Raised when the LLM response cannot be turned into a question set."""
+    def __init__(self, message: str, raw_response: Optional[str] = None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+REQUIRED_FIELDS = {"context", "question", "options", "correct_option", "explanation", "category", "difficulty"}
+
+def is_valid_question(question: Dict) -> bool:
+    """Check a generated question has every field and all four options."""
+    return (
+        isinstance(question, dict)
+        and all(field in question for field in REQUIRED_FIELDS)
+        and isinstance(question["options"], dict)
+        and all(opt in question["options"] for opt in ["A", "B", "C", "D"])
+    )
+
+def build_messages(personal_data: Dict, regional_data: Dict) -> List[Dict]:
+    """Build the chat messages asking the LLM for one question per subject."""
+    prompt = f"""
+    Given the following test results:
+    User ACT Results: {personal_data}
+    Regional ACT Results: {regional_data}
+    USA Median ACT Results: {SAMPLE_USA_RESULTS}
+
+    Generate 4 ACT-style multiple choice practice questions, one for each subject, focusing on areas needing improvement.
+    For each question:
+    1. Include any necessary context (passages, equations, diagrams described in text, etc.) before the question
+    2. Provide the actual question
+    3. Include four multiple choice options (A, B, C, D)
+    4. Indicate the correct answer
+    5. Provide a detailed explanation
+    6. Specify the category (Reading/Math/Science/English)
+    7. Specify the difficulty level (Easy/Medium/Hard)
+
+    Return the response in a valid JSON array format like this:
+    [
+        {{
+            "context": "Any necessary passage, equation, or background information...",
+            "question": "question text",
+            "options": {{
+                "A": "first option",
+                "B": "second option",
+                "C": "third option",
+                "D": "fourth option"
+            }},
+            "correct_option": "A",
+            "explanation": "explanation text",
+            "category": "subject category",
+            "difficulty": "difficulty level"
+        }}
+    ]
+    """
+
+    return [
+        {
+            "role": "system",
+            "content": "You are an educational assistant that generates ACT practice questions. Always return responses in valid JSON array format without any additional text or markdown formatting."
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+def request_questions(personal_data: Dict, regional_data: Dict) -> List[Dict]:
+    """
+    Call the LLaMA API and return a parsed question set.
+
+    Makes no Streamlit calls, so it is safe to run off the script thread.
+
+    Raises:
+        QuestionGenerationError: If the response is not a JSON list of questions
+    """
+    response = get_llm_client().chat.completions.create(
+        model='Meta-Llama-3.1-8B-Instruct',
+        messages=build_messages(personal_data, regional_data),
+        temperature=0.7,
+        max_tokens=2000
+    )
+
+    # Get and clean the response content
+    response_content = response.choices[0].message.content.strip()
+
+    # Parse JSON, keeping every complete question even if the array was truncated
+    questions = extract_json_objects(response_content)
+    if not questions:
+        raise QuestionGenerationError("Failed to parse JSON: no question objects in response", response_content)
+    return questions
+
+def fetch_question_set(personal_data: Dict, regional_data: Dict, viewer: str) -> List[Dict]:
+    """Return a question set for a viewer from the generation cache, generating on a miss."""
+    generation_cache = get_generation_cache()
+    cache_key = profile_key(personal_data, regional_data, PROMPT_VERSION)
+    cached = generation_cache.get(cache_key, viewer)
+    if cached is not None:
+        return cached
+
+    questions = request_questions(personal_data, regional_data)
+    if is_cacheable(questions):
+        generation_cache.put(cache_key, questions, viewer)
+    return questions
+
+def stream_request_questions(personal_data: Dict, regional_data: Dict) -> Iterator[Dict]:
+    """Stream the LLaMA completion, yielding each question once it is complete and valid."""
+    stream = get_llm_client().chat.completions.create(
+        model='Meta-Llama-3.1-8B-Instruct',
+        messages=build_messages(personal_data, regional_data),
+        temperature=0.7,
+        max_tokens=2000,
+        stream=True
+    )
+    yield from iter_array_objects(completion_deltas(stream), validator=is_valid_question)
+
+def stream_question_set(personal_data: Dict, regional_data: Dict) -> Iterator[Dict]:
+    """Yield the session's next question set as it streams in, serving cached sets when available."""
+    generation_cache = get_generation_cache()
+    cache_key = profile_key(personal_data, regional_data, PROMPT_VERSION)
+    viewer = session_student_id()
+    cached = generation_cache.get(cache_key, viewer)
+    if cached is not None:
+        yield from cached
+        return
+
+    streamed = []
     try:
-        prompt = f"""
-        Given the following test results:
-        User ACT Results: {personal_data}
-        Regional ACT Results: {regional_data}
-        USA Median ACT Results: {SAMPLE_USA_RESULTS}
-
-        Generate 4 ACT-style multiple choice practice questions, one for each subject, focusing on areas needing improvement.
-        For each question:
-        1. Include any necessary context (passages, equations, diagrams described in text, etc.) before the question
-        2. Provide the actual question
-        3. Include four multiple choice options (A, B, C, D)
-        4. Indicate the correct answer
-        5. Provide a detailed explanation
-        6. Specify the category (Reading/Math/Science/English)
-        7. Specify the difficulty level (Easy/Medium/Hard)
-
-        Return the response in a valid JSON array format like this:
-        [
-            {{
-                "context": "Any necessary passage, equation, or background information...",
-                "question": "question text",
-                "options": {{
-                    "A": "first option",
-                    "B": "second option",
-                    "C": "third option",
-                    "D": "fourth option"
-                }},
-                "correct_option": "A",
-                "explanation": "explanation text",
-                "category": "subject category",
-                "difficulty": "difficulty level"
-            }}
-        ]
-        """
+        for question in stream_request_questions(personal_data, regional_data):
+            streamed.append(question)
+            yield question
+    except Exception as e:
+        st.error(f"Error generating questions: {str(e)}")
 
-        response = client.chat.completions.create(
-            model='Meta-Llama-3.1-8B-Instruct',
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an educational assistant that generates ACT practice questions. Always return responses in valid JSON array format without any additional text or markdown formatting."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
-
-        # Get and clean the response content
-        response_content = response.choices[0].message.content.strip()
-        
-        # Parse JSON
-        try:
-            questions = json.loads(response_content)
-            if not isinstance(questions, list):
-                st.error("API response is not a list of questions")
-                return None
+    if not streamed:
+        st.error("No valid questions were generated.")
+    elif is_cacheable(streamed):
+        generation_cache.put(cache_key, streamed, viewer)
+
+def prefetch_validated_set(personal_data: Dict, regional_data: Dict, viewer: str) -> Optional[List[Dict]]:
+    """Producer for the prefetch pool: only fully valid sets are queued."""
+    questions = fetch_question_set(personal_data, regional_data, viewer)
+    valid = [q for q in questions if is_valid_question(q)]
+    return valid or None
+
+def prefetch_key(personal_data: Dict, regional_data: Dict, viewer: str) -> tuple:
+    return viewer, profile_key(personal_data, regional_data, PROMPT_VERSION)
 
-            return questions
+def generate_questions(personal_data: Dict, regional_data: Dict) -> Optional[List[Dict]]:
+    """Generate questions using the LLaMA API directly in Streamlit."""
+    try:
+        return fetch_question_set(personal_data, regional_data, session_student_id())
 
-        except json.JSONDecodeError as e:
-            st.error(f"Failed to parse JSON: {str(e)}")
-            st.write("Raw response:", response_content)
-            return None
+    except QuestionGenerationError as e:
+        st.error(str(e))
+        if e.raw_response is not None:
+            st.write("Raw response:", e.raw_response)
+        return None
 
     except Exception as e:
         st.error(f"Error generating questions: {str(e)}")
         return None
 
-def save_response_to_json(category: str, difficulty: str, is_correct: bool) -> dict:
-    """Save question response data to Pinata."""
+def prime_prefetch(personal_data: Dict, regional_data: Dict) -> None:
+    """Start filling the background queue of next question sets for this session."""
+    viewer = session_student_id()
+    get_prefetch_pool().fill(
+        prefetch_key(personal_data, regional_data, viewer),
+        lambda: prefetch_validated_set(dict(personal_data), dict(regional_data), viewer)
+    )
+
+def pin_answer_batch(answers: List[Dict]) -> List[Dict]:
+    """
+    Pin a batch of answers to Pinata, one JSON array per student.
+
+    Each pin is tagged with the student_id key-value so a student's history
+    can be listed without the rest of the account. Runs on the answer
+    spool's background thread, so it makes no Streamlit calls.
+    """
     JWT_TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJ1c2VySW5mb3JtYXRpb24iOnsiaWQiOiI4YmVmMTM1YS03NDY2LTQ1MjQtODhjMy00MGYzNzg2NmViZDciLCJlbWFpbCI6InNpbW9uZ2FnZTBAZ21haWwuY29tIiwiZW1haWxfdmVyaWZpZWQiOnRydWUsInBpbl9wb2xpY3kiOnsicmVnaW9ucyI6W3siZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiRlJBMSJ9LHsiZGVzaXJlZFJlcGxpY2F0aW9uQ291bnQiOjEsImlkIjoiTllDMSJ9XSwidmVyc2lvbiI6MX0sIm1mYV9lbmFibGVkIjpmYWxzZSwic3RhdHVzIjoiQUNUSVZFIn0sImF1dGhlbnRpY2F0aW9uVHlwZSI6InNjb3BlZEtleSIsInNjb3BlZEtleUtleSI6ImZhNjUxNWZkOTRkMDMyZGQwN2QzIiwic2NvcGVkS2V5U2VjcmV0IjoiOWUyZTRiOTE4NDVjMDA4OWE3YzM0NDdhZDVhZDJkZTAyMTdkNGM5MjExOTI2ODEyZDZmMWRkMDlmYmU2ODA4NCIsImV4cCI6MTc2MzM1NzkxNH0.zpWQXD9YWbE6BKiBavUtGyZJJkrEiZ4x0j1zxzgpmJs"
 
+    url = f"{PINATA_API_URL}/pinning/pinJSONToIPFS"
+    headers = {
+        "Authorization": f"Bearer {JWT_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    by_student = {}
+    for answer in answers:
+        by_student.setdefault(answer.get(STUDENT_KEY), []).append(answer)
+
+    # A failure part-way re-uploads the whole batch, like a crash before the spool rewrite
+    results = []
+    for student_id, student_answers in by_student.items():
+        metadata = {"name": f"answers-{student_answers[0]['timestamp']}-{len(student_answers)}"}
+        if student_id:
+            metadata["keyvalues"] = {STUDENT_KEY: student_id}
+        body = {"pinataContent": student_answers, "pinataMetadata": metadata}
+
+        response = get_http_client().post(url, headers=headers, json=body)
+        response.raise_for_status()
+        results.append(response.json())
+    return results
+
+def save_response_to_json(category: str, difficulty: str, is_correct: bool) -> dict:
+    """
+    Record a question response. The answer is spooled locally and returned
+    immediately; it is pinned to Pinata with other answers in the background.
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     response_data = {
         "timestamp": timestamp,
         "subject": category,
         "difficulty": difficulty,
         "correct": is_correct,
-        "set_number": st.session_state.get('question_set_number', 1)
-    }
-
-    url = "https://api.pinata.cloud/pinning/pinJSONToIPFS"
-    headers = {
-        "Authorization": f"Bearer {JWT_TOKEN}",
-        "Content-Type": "application/json"
+        "set_number": st.session_state.get('question_set_number', 1),
+        STUDENT_KEY: session_student_id()
     }
 
     try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json=response_data
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"Error uploading to Pinata: {e}")
+        return get_answer_spool(pin_answer_batch).submit(response_data)
+    except OSError as e:
+        st.error(f"Error saving answer: {e}")
         return {"error": str(e)}
 
 def main():
@@ -353,15 +489,29 @@ def main():
         }
         st.session_state.personal_data = personal_data
     generate_button = RateLimitedButton("Generate Questions", cooldown_seconds=10, key="generate")
-    if generate_button.clicked():
+    generate_clicked = generate_button.clicked()
+    if generate_clicked and STREAM_QUESTIONS:
+        st.session_state.questions = []
+        st.session_state.stream_request = (personal_data, regional_data)
+    elif generate_clicked:
         with st.spinner("Generating questions..."):
             questions = generate_questions(personal_data, regional_data)
             if questions:
                 st.session_state.questions = questions
                 st.success("Questions generated successfully!")
+                prime_prefetch(personal_data, regional_data)
+
+    # Stream a freshly requested set straight into the grid
+    if st.session_state.get('stream_request'):
+        stream_personal, stream_regional = st.session_state.pop('stream_request')
+        st.markdown("## Practice Questions")
+        questions = display_questions_grid(stream_question_set(stream_personal, stream_regional))
+        if questions:
+            st.session_state.questions = questions
+            prime_prefetch(stream_personal, stream_regional)
 
     # Display questions if they exist
-    if 'questions' in st.session_state and st.session_state.questions:
+    elif 'questions' in st.session_state and st.session_state.questions:
         st.markdown("## Practice Questions")
         display_questions_grid(st.session_state.questions)
 
@@ -0,0 +1,39 @@
+"""
+Student identity for partitioning pinned answers.
+
+Every answer carries the student's ID in its payload and as a Pinata
+key-value on its pin, so history and analytics can list just that
+student's pins server-side instead of the whole account's.
+"""
+import hashlib
+import json
+import uuid
+from typing import Optional
+
+STUDENT_KEY = "student_id"
+
+
+def student_pin_filter(student_id: str) -> str:
+    """pinList metadata[keyvalues] filter matching one student's pins."""
+    return json.dumps({STUDENT_KEY: {"value": student_id, "op": "eq"}})
+
+
+def student_slug(student_id: Optional[str]) -> str:
+    """Short, file-name-safe tag for per-student local state ('' for the whole account)."""
+    if not student_id:
+        return ""
+    return hashlib.sha256(student_id.encode("utf-8")).hexdigest()[:16]
+
+
+def session_student_id() -> str:
+    """
+    The current Streamlit session's student ID.
+
+    A ?student= query parameter names a returning student; otherwise the
+    session gets a random ID that lasts until the browser tab is closed.
+    """
+    import streamlit as st
+
+    if 'student_id' not in st.session_state:
+        st.session_state.student_id = st.query_params.get("student") or uuid.uuid4().hex
+    return st.session_state.student_id
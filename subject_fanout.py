@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("FANOUT_DEADLINE", "20"))
+DEFAULT_RETRIES = int(os.getenv("FANOUT_RETRIES", "1"))
+SUBJECT_MAX_TOKENS = int(os.getenv("FANOUT_MAX_TOKENS", "700"))
+
+
+@dataclass
+class FanoutResult:
+    """Questions that finished before the deadline, and why the rest did not."""
+    questions: Dict[str, Dict] = field(default_factory=dict)
+    failed: Dict[str, str] = field(default_factory=dict)
+    attempts: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return not self.failed
+
+    def ordered(self, subjects: List[str]) -> List[Dict]:
+        """Finished questions in subject order."""
+        return [self.questions[s] for s in subjects if s in self.questions]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    # Room for one fan-out per server thread (gunicorn.conf.py's GUNICORN_THREADS)
+                    max_workers=int(os.getenv("FANOUT_CONCURRENCY", "32")),
+                    thread_name_prefix="subject-fanout"
+                )
+    return _executor
+
+
+def fan_out(subjects: List[str], generate_one: Callable[[str, float], Dict],
+            deadline: float = DEFAULT_DEADLINE_SECONDS,
+            retries: int = DEFAULT_RETRIES) -> FanoutResult:
+    """
+    Run generate_one for every subject concurrently and collect what finishes in time.
+
+    generate_one(subject, timeout) returns a validated question or raises,
+    and must give up after timeout seconds (what is left of the deadline
+    when it starts). A subject that raises is resubmitted on its own, up to
+    retries more times, while the deadline allows. Subjects still running at
+    the deadline are reported as failed; their calls end by their own
+    timeout, and calls still queued at the deadline never start, so
+    abandoned work cannot hold the shared pool for later fan-outs.
+    """
+    start = time.monotonic()
+    result = FanoutResult()
+    executor = _get_executor()
+    pending = {}
+
+    def run(subject: str) -> Dict:
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            raise TimeoutError(f"deadline of {deadline:.1f}s passed before the call started")
+        return generate_one(subject, remaining)
+
+    def submit(subject: str) -> None:
+        result.attempts[subject] = result.attempts.get(subject, 0) + 1
+        pending[executor.submit(run, subject)] = subject
+
+    for subject in subjects:
+        submit(subject)
+
+    while pending:
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            subject = pending.pop(future)
+            try:
+                result.questions[subject] = future.result()
+                result.failed.pop(subject, None)
+            except Exception as e:
+                result.failed[subject] = str(e)
+                if result.attempts[subject] <= retries:
+                    logger.warning("Retrying %s question (attempt %d failed: %s)", subject, result.attempts[subject], e)
+                    submit(subject)
+
+    for subject in pending.values():
+        result.failed[subject] = f"deadline of {deadline:.1f}s exceeded"
+
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+async def afan_out(subjects: List[str], generate_one: Callable[[str, float], Awaitable[Dict]],
+                   deadline: float = DEFAULT_DEADLINE_SECONDS,
+                   retries: int = DEFAULT_RETRIES) -> FanoutResult:
+    """Async counterpart of fan_out; subjects still running at the deadline are cancelled."""
+    start = time.monotonic()
+    result = FanoutResult()
+    pending = {}
+
+    def submit(subject: str) -> None:
+        result.attempts[subject] = result.attempts.get(subject, 0) + 1
+        remaining = deadline - (time.monotonic() - start)
+        pending[asyncio.ensure_future(generate_one(subject, remaining))] = subject
+
+    for subject in subjects:
+        submit(subject)
+
+    while pending:
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            subject = pending.pop(task)
+            try:
+                result.questions[subject] = task.result()
+                result.failed.pop(subject, None)
+            except Exception as e:
+                result.failed[subject] = str(e)
+                if result.attempts[subject] <= retries:
+                    logger.warning("Retrying %s question (attempt %d failed: %s)", subject, result.attempts[subject], e)
+                    submit(subject)
+
+    for task, subject in pending.items():
+        task.cancel()
+        result.failed[subject] = f"deadline of {deadline:.1f}s exceeded"
+
+    result.elapsed = time.monotonic() - start
+    return result
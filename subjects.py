@@ -0,0 +1,15 @@
+# Subject names and difficulty weights shared by the scoring, replay and
+# prompt-building code
+SUBJECTS = ['Mathematics', 'Reading', 'Science', 'English']
+SUBJECT_MAP = {
+    'Math': 'Mathematics',
+    'English': 'English',
+    'Science': 'Science',
+    'Reading': 'Reading'
+}
+DIFFICULTY_MULTIPLIERS = {
+    'easy': 0.1,
+    'medium': 0.2,
+    'hard': 0.3
+}
+DEFAULT_DIFFICULTY_MULTIPLIER = 0.2
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidate:
+    """
+    In-process cache that serves the last good value while refreshing it.
+
+    get() only blocks when a key has never been loaded. Once an entry is
+    older than ttl_seconds it is still returned immediately, and a single
+    background thread per key reloads it. A failed reload keeps the previous
+    value and records the error. Foreground and background loads of a key
+    are coalesced, and a load never replaces an entry newer than itself.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._errors: Dict[Hashable, str] = {}
+        self._refreshing = set()
+        self._invalidated_at: Dict[Hashable, float] = {}
+        self._flight = SingleFlight("swr")
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, float]:
+        """
+        Return (value, loaded_at) for a key.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument function producing a fresh value
+
+        Returns:
+            Tuple[Any, float]: The cached value and the epoch time it was loaded
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return self.refresh(key, loader)
+
+        if time.time() - entry[1] > self.ttl_seconds:
+            self._refresh_in_background(key, loader)
+        return entry
+
+    def refresh(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, float]:
+        """Reload a key in the foreground (joining a load already in flight) and return the entry."""
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, float]:
+        started = time.time()
+        value = loader()
+        with self._lock:
+            current = self._entries.get(key)
+            if started < self._invalidated_at.get(key, 0.0) or (current is not None and current[1] > started):
+                # Something newer landed (or the key was invalidated) while this load ran
+                return current if current is not None else (value, started)
+            entry = self._entries[key] = (value, started)
+            self._errors.pop(key, None)
+        return entry
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(key, loader)
+            except Exception as e:
+                logger.warning("Background refresh of %r failed, serving stale value: %s", key, e)
+                with self._lock:
+                    self._errors[key] = str(e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="swr-refresh", daemon=True).start()
+
+    def is_refreshing(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._refreshing
+
+    def last_error(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            return self._errors.get(key)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidated_at[key] = time.time()
+
+
+_caches: Dict[str, StaleWhileRevalidate] = {}
+_caches_lock = threading.Lock()
+
+
+def get_swr_cache(name: str, ttl_seconds: float) -> StaleWhileRevalidate:
+    """
+    Return a named process-wide cache.
+
+    Streamlit re-executes page scripts on every rerun, but imported modules
+    persist, so caches created here survive reruns.
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = StaleWhileRevalidate(ttl_seconds)
+        return cache
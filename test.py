@@ -1,5 +1,4 @@
 import streamlit as st
-import requests
 import json
 from typing import Dict, List, Optional
 from math import ceil
@@ -7,7 +6,7 @@ from datetime import datetime
 import os
 
 
-from app import generate_questions
+from answer_log import get_answer_log
 
 # Initialize session state for questions and current page
 if 'questions' not in st.session_state:
@@ -18,7 +17,7 @@ if 'current_page' not in st.session_state:
 
 
 def save_response_to_json(category: str, difficulty: str, is_correct: bool) -> None:
-    """Save question response data to a JSON file."""
+    """Append question response data to the local answer log."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     response_data = {
         "timestamp": timestamp,
@@ -27,25 +26,8 @@ def save_response_to_json(category: str, difficulty: str, is_correct: bool) -> N
         "correct": is_correct
     }
 
-    # Create 'data' directory if it doesn't exist
-    if not os.path.exists('data'):
-        os.makedirs('data')
-
-    filename = 'data/question_responses.json'
-
-    # Read existing data
-    try:
-        with open(filename, 'r') as f:
-            responses = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        responses = []
-
-    # Append new response
-    responses.append(response_data)
-
-    # Write updated data back to file
-    with open(filename, 'w') as f:
-        json.dump(responses, f, indent=4)
+    # One fsynced line per answer instead of rewriting the whole history
+    get_answer_log().append(response_data)
 
 
 def display_question_card(question: Dict, index: int) -> None:
@@ -132,6 +114,8 @@ def display_questions_grid(questions: List[Dict]) -> None:
 
 def generate_questions(personal_data: Dict, regional_data: Dict) -> Optional[List[Dict]]:
     """Make API call to generate questions."""
+    import requests  # only needed once the user asks for questions
+
     try:
         response = requests.post(
             "http://localhost:5000/generate-questions",